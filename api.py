@@ -1,11 +1,155 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+
 import requests
+from requests.adapters import HTTPAdapter
+import numpy as np
 import pandas as pd
+import weather_cache
+
+# URL del archivo histórico (se puede apuntar a un servidor local con OPENMETEO_ARCHIVE_URL)
+ARCHIVE_URL = os.environ.get("OPENMETEO_ARCHIVE_URL", "https://archive-api.open-meteo.com/v1/archive")
+CHUNK_DAYS = 90         # Días por consulta al dividir rangos largos
+MAX_CONCURRENCY = 8     # Consultas en curso como máximo (entre todas las ubicaciones)
+RATE_LIMIT = 5.0        # Consultas por segundo como máximo (entre todas las ubicaciones, con reintentos)
+MAX_RETRIES = 5         # Reintentos ante 429/5xx, errores de red o timeouts
+BACKOFF_BASE = 1.0      # Segundos de espera base (se duplica en cada reintento)
+REQUEST_TIMEOUT = 30    # Segundos como máximo por consulta
+
+_RETRY_STATUS = {429, 500, 502, 503, 504}
 
-def get_openmeteo_history(lat, lon, start_date, end_date):
+# Clima como categoría (1 byte por registro en lugar de un string de Python);
+# las categorías van en orden alfabético para que la moda diaria desempate igual que antes
+CLIMA_CATEGORIES = ["Despejado", "Lluvia", "Nublado", "Sin datos"]
+CLIMA_DTYPE = pd.CategoricalDtype(CLIMA_CATEGORIES)
+_session = None
+_session_lock = threading.Lock()
+
+class WeatherFetchError(Exception):
     """
-    Consulta Open-Meteo para un rango de fechas y devuelve un DataFrame con datos horarios.
+    Un tramo del archivo histórico no se pudo obtener (después de los reintentos).
+    """
+
+@dataclass
+class WeatherFetchReport:
+    """
+    Resultado de consultar el clima de varias ubicaciones.
+    histories: clave -> DataFrame horario (None si no hay datos).
+    errors: clave -> lista de tramos que fallaron; con cache la ubicación puede
+    tener igualmente los datos ya guardados.
+    """
+    histories: dict = field(default_factory=dict)
+    errors: dict = field(default_factory=dict)
+    requests: int = 0
+    cells: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def ok(self):
+        return not self.errors
+
+def _get_session():
+    """
+    Sesión HTTP compartida con pool de conexiones (reutiliza conexiones entre consultas).
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=MAX_CONCURRENCY, pool_maxsize=MAX_CONCURRENCY)
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+        return _session
+
+def _backoff_delay(attempt, response=None):
+    """
+    Espera exponencial con jitter; respeta Retry-After si el servidor lo envía
+    (más un jitter, para que las consultas rechazadas juntas no se reintenten juntas).
+    """
+    jitter = BACKOFF_BASE * (2 ** attempt) * (0.5 + random.random() / 2)
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after is not None:
+            try:
+                return float(retry_after) + jitter
+            except ValueError:
+                pass
+    return jitter
+
+def split_date_range(start_date, end_date, chunk_days=CHUNK_DAYS):
+    """
+    Divide [start_date, end_date] en tramos consecutivos de a lo más chunk_days días.
+    """
+    start = date.fromisoformat(str(start_date))
+    end = date.fromisoformat(str(end_date))
+    chunks = []
+    while start <= end:
+        chunk_end = min(start + timedelta(days=chunk_days - 1), end)
+        chunks.append((start.isoformat(), chunk_end.isoformat()))
+        start = chunk_end + timedelta(days=1)
+    return chunks
+
+def _parse_history(data):
+    """
+    DataFrame horario a partir de la respuesta JSON del archivo histórico.
+    """
+    df = pd.DataFrame({
+        "time": data["hourly"]["time"],
+        "temperature": data["hourly"]["temperature_2m"],
+        "precipitation": data["hourly"]["precipitation"],
+        "cloudcover": data["hourly"]["cloudcover"]
+    })
+    df["time"] = pd.to_datetime(df["time"])
+    return df
+
+class _Throttle:
+    """
+    Límite global de las consultas de una corrida: a lo más max_concurrency en curso
+    y rate_limit iniciadas por segundo. Cada GET bloqueante corre en un hilo propio
+    y se abandona si no responde en `timeout` segundos.
+    """
+    def __init__(self, max_concurrency, rate_limit, timeout):
+        self.timeout = timeout
+        self.requests = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._interval = 1.0 / rate_limit if rate_limit else 0.0
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency)
+
+    async def _wait_slot(self):
+        async with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self._interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def get(self, params):
+        async with self._semaphore:
+            await self._wait_slot()
+            self.requests += 1
+            future = asyncio.get_running_loop().run_in_executor(
+                self._executor,
+                lambda: _get_session().get(ARCHIVE_URL, params=params, timeout=self.timeout),
+            )
+            return await asyncio.wait_for(future, self.timeout)
+
+    def close(self):
+        # No se espera a los hilos de consultas abandonadas por timeout
+        self._executor.shutdown(wait=False)
+
+async def _fetch_chunk(throttle, lat, lon, start_date, end_date):
+    """
+    Consulta un tramo de fechas con reintentos ante 429/5xx, errores de red y timeouts.
+    Devuelve un DataFrame con datos horarios o lanza WeatherFetchError.
     """
-    url = "https://archive-api.open-meteo.com/v1/archive"
     params = {
         "latitude": lat,
         "longitude": lon,
@@ -14,48 +158,239 @@ def get_openmeteo_history(lat, lon, start_date, end_date):
         "hourly": "temperature_2m,precipitation,cloudcover",
         "timezone": "auto"
     }
-    r = requests.get(url, params=params, timeout=30)
-    if r.status_code == 200:
-        data = r.json()
-        df = pd.DataFrame({
-            "time": data["hourly"]["time"],
-            "temperature": data["hourly"]["temperature_2m"],
-            "precipitation": data["hourly"]["precipitation"],
-            "cloudcover": data["hourly"]["cloudcover"]
-        })
-        df["time"] = pd.to_datetime(df["time"])
-        return df
+    for attempt in range(MAX_RETRIES + 1):
+        response = None
+        try:
+            response = await throttle.get(params)
+        except asyncio.TimeoutError:
+            error = f"sin respuesta en {throttle.timeout} s"
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = f"{type(e).__name__}: {e}"
+        else:
+            if response.status_code == 200:
+                return _parse_history(response.json())
+            error = f"HTTP {response.status_code}: {response.text[:200]}"
+            if response.status_code not in _RETRY_STATUS:
+                break
+        if attempt < MAX_RETRIES:
+            await asyncio.sleep(_backoff_delay(attempt, response))
+    raise WeatherFetchError(f"{start_date} a {end_date}: {error}")
+
+def group_by_cell(locations):
+    """
+    Índice espacial de las ubicaciones: agrupa las claves por celda de la grilla del
+    reanálisis (weather_cache.snap_coords).
+    locations: dict clave -> (lat, lon, start_date, end_date).
+    Devuelve dict (lat, lon) de la celda -> lista de claves.
+    """
+    cells = {}
+    for key, (lat, lon, *_) in locations.items():
+        cells.setdefault(weather_cache.snap_coords(lat, lon), []).append(key)
+    return cells
+
+def _iso_range(start_date, end_date):
+    return date.fromisoformat(str(start_date)).isoformat(), date.fromisoformat(str(end_date)).isoformat()
+
+def _merge_ranges(ranges):
+    """
+    Une los rangos de fechas que se solapan o son contiguos.
+    """
+    merged = []
+    for start, end in sorted((date.fromisoformat(s), date.fromisoformat(e)) for s, e in ranges):
+        if merged and start <= merged[-1][1] + timedelta(days=1):
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [(s.isoformat(), e.isoformat()) for s, e in merged]
+
+def _overlaps(chunk, start_date, end_date):
+    return chunk[0] <= end_date and chunk[1] >= start_date
+
+async def _fetch_cell(throttle, lat, lon, ranges, use_cache, offline):
+    """
+    Descarga una sola vez los rangos de una celda (la unión de los de sus ubicaciones),
+    en paralelo por tramos. Con use_cache sólo se consultan los días que faltan y cada
+    tramo obtenido se guarda aunque otros fallen (la próxima vez sólo faltan esos).
+    Devuelve (lista de (tramo, DataFrame) obtenidos, lista de (tramo, error)).
+    """
+    if use_cache:
+        missing = []
+        if not offline:
+            for date_range in ranges:
+                missing += await asyncio.to_thread(weather_cache.missing_ranges, lat, lon, *date_range)
     else:
-        print("Error:", r.status_code, r.text)
+        missing = ranges
+
+    chunks = [chunk for date_range in missing for chunk in split_date_range(*date_range)]
+    results = await asyncio.gather(*(_fetch_chunk(throttle, lat, lon, *chunk) for chunk in chunks),
+                                   return_exceptions=True)
+    parts, failures = [], []
+    for chunk, result in zip(chunks, results):
+        if isinstance(result, BaseException):
+            failures.append((chunk, str(result)))
+        elif use_cache:
+            await asyncio.to_thread(weather_cache.store_history, lat, lon, result, *chunk)
+        else:
+            parts.append((chunk, result))
+    return parts, failures
+
+def _slice_parts(parts, start_date, end_date):
+    """
+    Horas de [start_date, end_date] a partir de los tramos descargados para la celda.
+    """
+    frames = [df for chunk, df in parts if _overlaps(chunk, start_date, end_date)]
+    if not frames:
         return None
+    history = pd.concat(frames, ignore_index=True).drop_duplicates(subset="time", keep="first")
+    end = pd.Timestamp(end_date) + pd.Timedelta(days=1)
+    history = history[(history["time"] >= pd.Timestamp(start_date)) & (history["time"] < end)]
+    return history.reset_index(drop=True)
+
+async def fetch_histories_async(locations, use_cache=True, offline=None, max_concurrency=MAX_CONCURRENCY,
+                                rate_limit=RATE_LIMIT, timeout=REQUEST_TIMEOUT, load=True):
+    """
+    Consulta el clima horario de muchas ubicaciones a la vez.
+    locations: dict clave -> (lat, lon, start_date, end_date).
+    Las ubicaciones de una misma celda de la grilla se consultan una sola vez y el
+    resultado se reparte. Todas las consultas comparten el límite de concurrencia y de
+    consultas por segundo; una celda que falla no detiene a las demás y el error queda
+    registrado en el reporte para cada ubicación afectada.
+    Con use_cache y load=False sólo se completa el cache (histories queda en None).
+    Devuelve un WeatherFetchReport.
+    """
+    if offline is None:
+        offline = weather_cache.OFFLINE
+    t0 = time.perf_counter()
+    ranges = {key: _iso_range(*location[2:]) for key, location in locations.items()}
+    cells = group_by_cell(locations)
+    throttle = _Throttle(max_concurrency, rate_limit, timeout)
+    try:
+        results = await asyncio.gather(
+            *(_fetch_cell(throttle, *cell, _merge_ranges([ranges[key] for key in keys]), use_cache, offline)
+              for cell, keys in cells.items()),
+            return_exceptions=True,
+        )
+    finally:
+        throttle.close()
+
+    report = WeatherFetchReport(requests=throttle.requests, cells=len(cells))
+    for (cell, keys), result in zip(cells.items(), results):
+        cell_error = None
+        if isinstance(result, BaseException):
+            parts, failures, cell_error = [], [], f"{type(result).__name__}: {result}"
+        else:
+            parts, failures = result
+        for key in keys:
+            start_date, end_date = ranges[key]
+            errors = [error for chunk, error in failures if _overlaps(chunk, start_date, end_date)]
+            if cell_error is not None:
+                errors.append(cell_error)
+            if use_cache:
+                history = await asyncio.to_thread(weather_cache.load_history, *cell, start_date, end_date) \
+                    if load else None
+            else:
+                history = None if errors else _slice_parts(parts, start_date, end_date)
+            report.histories[key] = history
+            if errors:
+                report.errors[key] = errors
+    report.elapsed = time.perf_counter() - t0
+    return report
+
+def _run_sync(coro):
+    """
+    Ejecuta una corrutina desde código sincrónico (en otro hilo si ya hay un event loop activo).
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
+
+def fetch_histories(locations, **kwargs):
+    """
+    Versión sincrónica de fetch_histories_async (mismos argumentos).
+    """
+    return _run_sync(fetch_histories_async(locations, **kwargs))
+
+def get_openmeteo_history(lat, lon, start_date, end_date, use_cache=True, offline=None):
+    """
+    Consulta Open-Meteo para un rango de fechas y devuelve un DataFrame con datos horarios.
+    Se consulta la celda de la grilla del reanálisis que contiene la ubicación.
+    Con use_cache sólo se consultan los días que faltan en el cache local; en modo
+    offline se devuelve únicamente lo que ya está guardado.
+    Sin cache, si algún tramo falla se devuelve None.
+    """
+    report = fetch_histories({"ubicacion": (lat, lon, start_date, end_date)}, use_cache=use_cache, offline=offline)
+    for error in report.errors.get("ubicacion", []):
+        print("Error:", error)
+    return report.histories["ubicacion"]
+
+def classify_weather(precipitation, cloudcover, found=None):
+    """
+    Clasifica cada hora como Lluvia / Nublado / Despejado (o "Sin datos" si no hay registro).
+    Devuelve un Categorical con las categorías CLIMA_CATEGORIES.
+    """
+    precipitation = np.asarray(precipitation, dtype=float)
+    cloudcover = np.asarray(cloudcover, dtype=float)
+    if found is None:
+        found = np.ones(len(precipitation), dtype=bool)
+    codes = np.select(
+        [~found, precipitation > 0, cloudcover > 60],
+        [CLIMA_CATEGORIES.index("Sin datos"), CLIMA_CATEGORIES.index("Lluvia"), CLIMA_CATEGORIES.index("Nublado")],
+        default=CLIMA_CATEGORIES.index("Despejado"),
+    ).astype(np.int8)
+    return pd.Categorical.from_codes(codes, dtype=CLIMA_DTYPE)
+
+def join_weather(date_times, df_clima):
+    """
+    Cruza cada DateTime con la hora correspondiente de Open-Meteo.
+    Usa una búsqueda por índice sobre la hora truncada en lugar de filtrar
+    el DataFrame de clima completo para cada registro.
+    Devuelve un DataFrame alineado con date_times (columnas Clima categórica,
+    precipitation y cloudcover en float32).
+    """
+    index = date_times.index if isinstance(date_times, pd.Series) else None
+    keys = pd.DatetimeIndex(date_times).floor("h")
+    n = len(keys)
+
+    if df_clima is None or df_clima.empty:
+        return pd.DataFrame({
+            "Clima": pd.Categorical(np.full(n, "Sin datos"), dtype=CLIMA_DTYPE),
+            "precipitation": np.full(n, np.nan, dtype=np.float32),
+            "cloudcover": np.full(n, np.nan, dtype=np.float32),
+        }, index=index)
+
+    # Open-Meteo entrega una fila por hora; ante duplicados (cambio de horario) gana la primera
+    df_clima = df_clima.assign(time=df_clima["time"].dt.floor("h"))
+    df_clima = df_clima.drop_duplicates(subset="time", keep="first")
+    pos = pd.Index(df_clima["time"]).get_indexer(keys)
+    found = pos >= 0
+
+    precipitation = np.where(found, df_clima["precipitation"].to_numpy(dtype=float)[pos], np.nan)
+    cloudcover = np.where(found, df_clima["cloudcover"].to_numpy(dtype=float)[pos], np.nan)
+
+    return pd.DataFrame({
+        "Clima": classify_weather(precipitation, cloudcover, found),
+        "precipitation": precipitation.astype(np.float32),
+        "cloudcover": cloudcover.astype(np.float32),
+    }, index=index)
+
+def get_openmeteo_weather(date_times, lat, lon):
+    """
+    Consulta Open-Meteo para el rango de date_times y devuelve, alineado con cada
+    DateTime, el evento climático y los valores horarios de precipitación y nubosidad.
+    """
+    if len(date_times) == 0:
+        return join_weather(date_times, None)
+    start_date = pd.Timestamp(np.min(date_times)).strftime("%Y-%m-%d")
+    end_date = pd.Timestamp(np.max(date_times)).strftime("%Y-%m-%d")
+    df_clima = get_openmeteo_history(lat, lon, start_date, end_date)
+    return join_weather(date_times, df_clima)
 
 def get_openmeteo_events(date_times, lat, lon):
     """
     Cruza los datos horarios de Open-Meteo con las fechas/hora del CSV.
     Devuelve una lista de eventos por cada DateTime.
     """
-    start_date = min(date_times).strftime("%Y-%m-%d")
-    end_date = max(date_times).strftime("%Y-%m-%d")
-    df_clima = get_openmeteo_history(lat, lon, start_date, end_date)
-    eventos = []
-    if df_clima is not None:
-        df_clima["hour"] = df_clima["time"].dt.hour
-        df_clima["date"] = df_clima["time"].dt.date
-        for dt in date_times:
-            fecha = dt.date()
-            hora = dt.hour
-            clima = df_clima[(df_clima["date"] == fecha) & (df_clima["hour"] == hora)]
-            if not clima.empty:
-                row = clima.iloc[0]
-                if row["precipitation"] > 0:
-                    evento = "Lluvia"
-                elif row["cloudcover"] > 60:
-                    evento = "Nublado"
-                else:
-                    evento = "Despejado"
-                eventos.append(evento)
-            else:
-                eventos.append("Sin datos")
-    else:
-        eventos = ["Sin datos"] * len(date_times)
-    return eventos
+    return get_openmeteo_weather(date_times, lat, lon)["Clima"].tolist()
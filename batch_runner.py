@@ -0,0 +1,283 @@
+"""
+Ejecución batch sobre toda la flota de proyectos del registro (data_manager).
+
+Para cada Proyecto busca su archivo de datos (<data-dir>/<Proyecto>.csv), consulta el clima,
+aplica los métodos de soiling, genera recomendaciones y el calendario de limpiezas de costo
+mínimo (cleaning_optimizer), repartiendo los proyectos en un
+pool de procesos. Escribe resultados por proyecto y una tabla resumen de la flota.
+Antes de repartir los proyectos se descarga el clima de toda la flota a la vez (bajo un
+único límite de consultas) al cache local, que luego leen los procesos.
+
+Uso:
+    python batch_runner.py --data-dir datos/ --out-dir resultados/
+"""
+import argparse
+import io
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+import weather_cache
+from api import fetch_histories
+from calibration import DEFAULT_GRIDS, calibrate
+from cleaning_optimizer import (DEFAULT_CLEANING_COST, DEFAULT_DAILY_ENERGY_KWH, DEFAULT_ENERGY_PRICE,
+                                optimize_cleaning_schedule)
+from data_manager import DEFAULT_REGISTRY_PATH, load_ubicaciones
+from dataset_store import DEFAULT_STORE_PATH, write_project
+from fleet_summary import store_results
+from pipeline import (SCADA_COLUMNS, load_scada_csv, attach_weather, run_model, daily_summary, project_summary,
+                      build_recommendations)
+
+DEFAULT_METODOS = ["Kimber", "SOMOSclean"]
+RESULT_COLUMNS = ['DateTime', 'Soiling Ratio', 'Soiling Ratio Original', 'Clima', 'precipitation']
+SPAN_PROBE_ROWS = 1000  # Filas del inicio y del final del archivo con las que se estima su rango de fechas
+
+def _slug(text):
+    return "".join(c if c.isalnum() or c in "-_" else "_" for c in str(text))
+
+def _iso_date(value):
+    return value.strftime("%Y-%m-%d") if value is not None else None
+
+def find_data_file(data_dir, proyecto):
+    """
+    Ruta del archivo de datos del proyecto, o None si no existe.
+    """
+    path = os.path.join(data_dir, f"{proyecto}.csv")
+    return path if os.path.exists(path) else None
+
+def _read_edges(data_path, n_rows=SPAN_PROBE_ROWS, block_size=64 * 1024):
+    """
+    Primeras y últimas n_rows filas del CSV (columnas de ingesta) sin recorrer el archivo:
+    el final se lee hacia atrás por bloques desde el fin del archivo.
+    """
+    head = pd.read_csv(data_path, usecols=SCADA_COLUMNS, dtype=str, nrows=n_rows)
+    with open(data_path, "rb") as f:
+        header = f.readline()
+        end = position = f.seek(0, os.SEEK_END)
+        data = b""
+        while position > 0 and data.count(b"\n") <= n_rows:
+            position = max(0, position - block_size)
+            f.seek(position)
+            data = f.read(end - position)
+    # La primera línea leída es el encabezado o una fila cortada por el bloque
+    lines = data.splitlines()[1:][-n_rows:]
+    tail = pd.read_csv(io.BytesIO(header + b"\n".join(lines)), usecols=SCADA_COLUMNS, dtype=str)
+    return pd.concat([head, tail], ignore_index=True)
+
+def data_date_span(data_path):
+    """
+    Primer y último día con fecha válida del archivo, o None.
+    Sólo mira el inicio y el final del archivo (los datos SCADA vienen en orden); si no lo
+    estuvieran, los días fuera del rango estimado los consulta después el propio proyecto.
+    """
+    dates = pd.to_datetime(_read_edges(data_path)['DateTime'], errors='coerce').dropna()
+    if dates.empty:
+        return None
+    return dates.min().strftime("%Y-%m-%d"), dates.max().strftime("%Y-%m-%d")
+
+def prefetch_weather(jobs):
+    """
+    Descarga al cache el clima de todos los proyectos con consultas concurrentes.
+    Devuelve un dict proyecto -> descripción del error para los que fallaron
+    (esos proyectos igual se procesan con el clima que haya en cache). Un archivo que no
+    se puede leer queda con su error y no detiene la descarga de los demás.
+    """
+    errores = {}
+    locations = {}
+    for proyecto, lat, lon, data_path in jobs:
+        try:
+            span = data_date_span(data_path)
+        except Exception as e:
+            errores[proyecto] = f"{type(e).__name__}: {e}"
+            continue
+        if span is not None:
+            locations[proyecto] = (lat, lon, *span)
+    if not locations:
+        return errores
+    try:
+        report = fetch_histories(locations, load=False)
+    except Exception as e:
+        traceback.print_exc()
+        return {**errores, **{proyecto: f"{type(e).__name__}: {e}" for proyecto in locations}}
+    print(f"Clima de {len(locations)} proyectos ({report.cells} celdas de la grilla) en {report.elapsed:.1f} s "
+          f"({report.requests} consultas, {len(report.errors)} con errores)")
+    return {**errores, **{proyecto: "; ".join(errors) for proyecto, errors in report.errors.items()}}
+
+def run_project(proyecto, lat, lon, data_path, metodos, threshold, out_dir, store_path=None,
+                calibrar=False, cleaning_cost=DEFAULT_CLEANING_COST, energy_price=DEFAULT_ENERGY_PRICE,
+                daily_energy_kwh=DEFAULT_DAILY_ENERGY_KWH):
+    """
+    Procesa un proyecto completo (se ejecuta dentro de un proceso del pool).
+    Devuelve una fila del resumen por método; los errores se reportan en la columna "error".
+    Con store_path guarda además los datos limpios y con clima en el almacén Parquet.
+    Con calibrar ajusta los parámetros de cada modelo al Soiling Ratio medido.
+    cleaning_cost, energy_price y daily_energy_kwh valorizan el calendario óptimo de limpiezas.
+    """
+    t_start = time.perf_counter()
+    rows = []
+    base = {"Proyecto": proyecto, "Latitud": lat, "Longitud": lon}
+    try:
+        df = load_scada_csv(data_path)
+        df = attach_weather(df, lat, lon)
+        if store_path is not None:
+            write_project(df, proyecto, store_path)
+        t_shared = time.perf_counter() - t_start
+
+        project_dir = os.path.join(out_dir, _slug(proyecto))
+        os.makedirs(project_dir, exist_ok=True)
+
+        for metodo in metodos:
+            t0 = time.perf_counter()
+            try:
+                df_model, _ = run_model(df, metodo)
+                daily_stats = daily_summary(df_model)
+                kpis = project_summary(df_model, metodo, threshold, daily_stats)
+                recomendaciones = build_recommendations(df_model, metodo, threshold, daily_stats)
+                limpiezas = optimize_cleaning_schedule(daily_stats, metodo, cleaning_cost, energy_price,
+                                                       daily_energy_kwh)
+
+                columns = [c for c in RESULT_COLUMNS if c in df_model.columns]
+                df_model[columns].to_csv(os.path.join(project_dir, f"{_slug(metodo)}.csv"), index=False)
+                with open(os.path.join(project_dir, f"recomendaciones_{_slug(metodo)}.md"), "w", encoding="utf-8") as f:
+                    f.write(recomendaciones)
+                pd.DataFrame({"Fecha": limpiezas["fechas"]}).to_csv(
+                    os.path.join(project_dir, f"limpiezas_{_slug(metodo)}.csv"), index=False, date_format="%Y-%m-%d")
+
+                calibracion = {}
+                if calibrar and metodo in DEFAULT_GRIDS:
+                    resultado = calibrate(df, metodo)
+                    resultado["superficie"].to_csv(
+                        os.path.join(project_dir, f"calibracion_{_slug(metodo)}.csv"), index=False)
+                    calibracion = {
+                        "Parametros calibrados": json.dumps(resultado["parametros"]),
+                        "RMSE calibrado": resultado["rmse"],
+                    }
+
+                rows.append({
+                    **base,
+                    "Metodo": metodo,
+                    "SR Actual": kpis["sr_actual"],
+                    "SR Promedio": kpis["sr_avg"],
+                    "Perdida (%)": kpis["sr_loss"],
+                    "Dias bajo umbral": kpis["days_below"],
+                    "Dias analizados": kpis["total_days"],
+                    "Estado": kpis["status"][0],
+                    "Ultima limpieza": _iso_date(kpis["ultima_limpieza"]),
+                    "Ultimo dato": _iso_date(kpis["ultimo_dato"]),
+                    "Umbral": threshold,
+                    "Limpiezas optimas": limpiezas["n_limpiezas"],
+                    "Primera limpieza": _iso_date(limpiezas["fechas"][0]) if limpiezas["fechas"] else None,
+                    "Costo optimo": limpiezas["costo_optimo"],
+                    "Intervalo heuristica (dias)": limpiezas["intervalo_heuristica"],
+                    "Costo heuristica": limpiezas["costo_heuristica"],
+                    "Ahorro vs heuristica": limpiezas["ahorro"],
+                    "Tiempo (s)": t_shared + time.perf_counter() - t0,
+                    **calibracion,
+                    "error": None,
+                })
+            except Exception as e:
+                rows.append({**base, "Metodo": metodo, "Tiempo (s)": time.perf_counter() - t0,
+                             "error": f"{type(e).__name__}: {e}"})
+    except Exception as e:
+        traceback.print_exc()
+        rows = [{**base, "Metodo": metodo, "Tiempo (s)": time.perf_counter() - t_start,
+                 "error": f"{type(e).__name__}: {e}"} for metodo in metodos]
+    return rows
+
+def run_fleet(ubicaciones_path, data_dir, out_dir, metodos=DEFAULT_METODOS, threshold=0.9, workers=None,
+              store_path=None, calibrar=False, prefetch=True, summary_path=DEFAULT_REGISTRY_PATH,
+              cleaning_cost=DEFAULT_CLEANING_COST, energy_price=DEFAULT_ENERGY_PRICE,
+              daily_energy_kwh=DEFAULT_DAILY_ENERGY_KWH):
+    """
+    Ejecuta todos los proyectos en un pool de procesos y escribe resumen_flota.csv.
+    Un proyecto que falla no detiene la corrida. Con prefetch el clima de la flota se
+    descarga antes, en conjunto; los errores de esa descarga quedan en la columna "error_clima".
+    Cada proyecto terminado actualiza el resumen de la vista de flota en summary_path (None: no se guarda).
+    """
+    ubicaciones = load_ubicaciones(ubicaciones_path)
+    os.makedirs(out_dir, exist_ok=True)
+
+    rows = []
+    jobs = []
+    for _, row in ubicaciones.iterrows():
+        data_path = find_data_file(data_dir, row["Proyecto"])
+        if data_path is None:
+            rows.append({"Proyecto": row["Proyecto"], "Latitud": row["Latitud"], "Longitud": row["Longitud"],
+                         "Metodo": None, "error": "Sin archivo de datos"})
+        else:
+            jobs.append((row["Proyecto"], float(row["Latitud"]), float(row["Longitud"]), data_path))
+
+    t_start = time.perf_counter()
+    errores_clima = prefetch_weather(jobs) if prefetch and not weather_cache.OFFLINE else {}
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        futures = {
+            executor.submit(run_project, proyecto, lat, lon, data_path, metodos, threshold, out_dir,
+                            store_path, calibrar, cleaning_cost, energy_price, daily_energy_kwh): proyecto
+            for proyecto, lat, lon, data_path in jobs
+        }
+        for i, future in enumerate(as_completed(futures), start=1):
+            proyecto = futures[future]
+            try:
+                project_rows = future.result()
+            except Exception as e:
+                project_rows = [{"Proyecto": proyecto, "Metodo": metodo, "error": f"{type(e).__name__}: {e}"}
+                                for metodo in metodos]
+            if proyecto in errores_clima:
+                project_rows = [{**r, "error_clima": errores_clima[proyecto]} for r in project_rows]
+            rows.extend(project_rows)
+            if summary_path is not None:
+                store_results(project_rows, summary_path)
+            errores = [r["error"] for r in project_rows if r.get("error")]
+            tiempo = sum(r.get("Tiempo (s)") or 0 for r in project_rows)
+            estado = f"ERROR ({errores[0]})" if errores else "OK"
+            print(f"[{i}/{len(jobs)}] {proyecto}: {estado} en {tiempo:.2f} s")
+
+    summary = pd.DataFrame(rows)
+    summary.to_csv(os.path.join(out_dir, "resumen_flota.csv"), index=False)
+
+    sin_archivo = len(ubicaciones) - len(jobs)
+    fallidos = summary.loc[summary["Metodo"].notna() & summary["error"].notna(), "Proyecto"].nunique() if rows else 0
+    if "Ahorro vs heuristica" in summary.columns:
+        print(f"Calendario óptimo de limpiezas: ahorro de {summary['Ahorro vs heuristica'].sum():,.0f} "
+              f"frente a la frecuencia fija de las recomendaciones")
+    print(f"Flota procesada en {time.perf_counter() - t_start:.1f} s: {len(jobs)} proyectos con datos, "
+          f"{fallidos} con errores, {sin_archivo} sin archivo")
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cálculo de soiling para toda la flota de proyectos")
+    parser.add_argument("--ubicaciones", default=DEFAULT_REGISTRY_PATH,
+                        help="Registro de proyectos (SQLite) o archivo de ubicaciones (xlsx)")
+    parser.add_argument("--data-dir", required=True, help="Directorio con un <Proyecto>.csv por proyecto")
+    parser.add_argument("--out-dir", default="resultados", help="Directorio de salida")
+    parser.add_argument("--metodos", nargs="+", default=DEFAULT_METODOS,
+                        choices=["Sin modelo", "SOMOSclean", "Kimber"], help="Métodos a aplicar")
+    parser.add_argument("--threshold", type=float, default=0.9, help="Umbral de alerta (0-1)")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos en paralelo (default: todos los núcleos)")
+    parser.add_argument("--store", nargs="?", const=DEFAULT_STORE_PATH, default=None,
+                        help="Guardar los datos procesados en el almacén Parquet (ruta opcional)")
+    parser.add_argument("--calibrar", action="store_true",
+                        help="Calibrar los parámetros de Kimber/SOMOSclean contra los datos medidos")
+    parser.add_argument("--resumen", default=DEFAULT_REGISTRY_PATH,
+                        help="Base SQLite donde se actualiza el resumen de la vista de flota")
+    parser.add_argument("--sin-prefetch", action="store_true",
+                        help="No descargar el clima de la flota antes de procesar (cada proceso consulta el suyo)")
+    parser.add_argument("--costo-limpieza", type=float, default=DEFAULT_CLEANING_COST,
+                        help="Costo de una limpieza (para el calendario óptimo)")
+    parser.add_argument("--precio-energia", type=float, default=DEFAULT_ENERGY_PRICE,
+                        help="Precio de la energía por kWh")
+    parser.add_argument("--energia-diaria", type=float, default=DEFAULT_DAILY_ENERGY_KWH,
+                        help="Energía diaria de cada planta sin soiling (kWh)")
+    args = parser.parse_args(argv)
+
+    run_fleet(args.ubicaciones, args.data_dir, args.out_dir, args.metodos, args.threshold, args.workers,
+              args.store, args.calibrar, prefetch=not args.sin_prefetch, summary_path=args.resumen,
+              cleaning_cost=args.costo_limpieza, energy_price=args.precio_energia,
+              daily_energy_kwh=args.energia_diaria)
+
+if __name__ == "__main__":
+    main()
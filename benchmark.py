@@ -0,0 +1,283 @@
+"""
+Benchmarks del pipeline de soiling con datos sintéticos deterministas.
+
+Genera series sintéticas de Soiling Ratio (SCADA) y de clima horario para varios tamaños
+y resoluciones, mide tiempo y memoria máxima de cada etapa y guarda los resultados en JSON
+para compararlos entre versiones.
+
+Con --clima se mide además la descarga de clima de muchas ubicaciones contra el servidor
+local de Open-Meteo (openmeteo_stub.py), con latencia y errores configurables.
+
+Uso:
+    python benchmark.py --sizes 1e3 1e4 1e5 --freqs 5min h --out bench.json
+    python benchmark.py --quick --compare bench_anterior.json
+    python benchmark.py --quick --clima --clima-latencia 0.2 --clima-error-rate 0.1
+"""
+import argparse
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import api
+from soiling_methods import calculate_kimber_ratio, calculate_somosclean_ratio, generar_recomendaciones
+from utils import build_daily_stats, get_consecutive_days_below, get_days_below_threshold, get_unique_days_count
+
+DEFAULT_SIZES = [10**3, 10**4, 10**5, 10**6, 10**7]
+QUICK_SIZES = [10**3, 10**4, 10**5]
+DEFAULT_FREQS = ["1min", "5min", "15min", "h"]
+HORA_INICIO = 6
+HORA_FIN = 20
+
+def generate_weather(start, end, seed=0):
+    """
+    Clima horario sintético entre start y end (mismas columnas que get_openmeteo_history).
+    Las lluvias llegan en episodios y suben la nubosidad.
+    """
+    rng = np.random.default_rng(seed)
+    time_index = pd.date_range(pd.Timestamp(start).floor("D"), pd.Timestamp(end).ceil("D"), freq="h")
+    n = len(time_index)
+
+    # Episodios de lluvia: inicio con prob. baja, duración geométrica de algunas horas
+    starts = rng.random(n) < 0.004
+    duration = rng.geometric(0.25, n)
+    raining = np.zeros(n, dtype=bool)
+    for i in np.flatnonzero(starts):
+        raining[i:i + duration[i]] = True
+    precipitation = np.where(raining, np.round(rng.gamma(1.2, 2.5, n), 1), 0.0)
+    cloudcover = np.where(raining, rng.uniform(70, 100, n), rng.beta(1.2, 2.5, n) * 100)
+    temperature = 20 + 8 * np.sin(2 * np.pi * (time_index.hour - 9) / 24) + rng.normal(0, 1.5, n)
+
+    return pd.DataFrame({
+        "time": time_index,
+        "temperature": np.round(temperature, 1),
+        "precipitation": precipitation,
+        "cloudcover": np.round(cloudcover),
+    })
+
+def generate_scada(n_rows, freq="h", start="2020-01-01", seed=0, weather=None):
+    """
+    Serie SCADA sintética con n_rows registros en horario de operación (6:00-20:00).
+    El Soiling Ratio cae a tasa constante y se recupera con las lluvias del clima sintético.
+    """
+    rng = np.random.default_rng(seed)
+    step = pd.Timedelta(pd.tseries.frequencies.to_offset(freq))
+    daylight_share = (HORA_FIN - HORA_INICIO + 1) / 24
+    periods = int(np.ceil(n_rows / daylight_share * 1.05)) + int(pd.Timedelta("1D") / step)
+    date_time = pd.date_range(start, periods=periods, freq=freq)
+    date_time = date_time[(date_time.hour >= HORA_INICIO) & (date_time.hour <= HORA_FIN)][:n_rows]
+
+    if weather is None:
+        weather = generate_weather(date_time[0], date_time[-1], seed)
+    rain_hours = weather.loc[weather["precipitation"] >= 5, "time"]
+    cleaned = date_time.floor("h").isin(rain_hours)
+
+    # Días desde la última limpieza (lluvia ≥ 5 mm) → pérdida acumulada
+    elapsed_days = (date_time - date_time[0]) / pd.Timedelta("1D")
+    last_clean = pd.Series(np.where(cleaned, elapsed_days, np.nan)).ffill().fillna(0).to_numpy()
+    loss = np.minimum(0.002 * (elapsed_days - last_clean), 0.25)
+    soiling_ratio = np.clip(1 - loss + rng.normal(0, 0.003, len(date_time)), 0, 1)
+
+    return pd.DataFrame({"DateTime": date_time, "Soiling Ratio": np.round(soiling_ratio * 100, 3)})
+
+@contextmanager
+def _synthetic_weather(weather):
+    """
+    Sustituye la consulta a Open-Meteo por el clima sintético durante el benchmark.
+    """
+    original = api.get_openmeteo_history
+    api.get_openmeteo_history = lambda lat, lon, start_date, end_date, **kwargs: weather.copy()
+    try:
+        yield
+    finally:
+        api.get_openmeteo_history = original
+
+def _measure(fn, repeat):
+    """
+    Mejor tiempo de `repeat` ejecuciones y memoria máxima (MB) de una ejecución.
+    """
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, peak / 1024**2
+
+def _stages(df, weather):
+    """
+    Etapas a medir sobre un dataset (cada una es una función sin argumentos).
+    """
+    def weather_join():
+        with _synthetic_weather(weather):
+            return api.get_openmeteo_events(df["DateTime"], 0.0, 0.0)
+
+    df_model = df.copy()
+    df_model["Soiling Ratio"] = df_model["Soiling Ratio"] / 100
+    return {
+        "get_openmeteo_events": weather_join,
+        "calculate_kimber_ratio": lambda: calculate_kimber_ratio(df),
+        "calculate_somosclean_ratio": lambda: calculate_somosclean_ratio(df),
+        "generar_recomendaciones": lambda: generar_recomendaciones(df_model, "SOMOSclean", 0.9),
+        "get_days_below_threshold": lambda: get_days_below_threshold(df_model, "Soiling Ratio", 0.96),
+        "get_consecutive_days_below": lambda: get_consecutive_days_below(df_model, "Soiling Ratio", 0.96),
+        "get_unique_days_count": lambda: get_unique_days_count(df_model),
+        "build_daily_stats": lambda: build_daily_stats(df_model),
+    }
+
+def run_benchmarks(sizes=DEFAULT_SIZES, freqs=DEFAULT_FREQS, stages=None, repeat=3, seed=0, verbose=True):
+    """
+    Ejecuta los benchmarks y devuelve una lista de resultados (uno por etapa, tamaño y resolución).
+    """
+    results = []
+    for freq in freqs:
+        for n_rows in sizes:
+            df = generate_scada(n_rows, freq, seed=seed)
+            weather = generate_weather(df["DateTime"].min(), df["DateTime"].max(), seed)
+            df[["Clima", "precipitation", "cloudcover"]] = api.join_weather(df["DateTime"], weather)
+
+            # Menos repeticiones para los tamaños grandes
+            n_repeat = repeat if n_rows <= 10**5 else 1
+            for stage, fn in _stages(df, weather).items():
+                if stages and stage not in stages:
+                    continue
+                seconds, peak_mb = _measure(fn, n_repeat)
+                results.append({
+                    "stage": stage,
+                    "rows": int(n_rows),
+                    "freq": freq,
+                    "seconds": seconds,
+                    "peak_mb": peak_mb,
+                    "rows_per_second": n_rows / seconds if seconds > 0 else None,
+                })
+                if verbose:
+                    print(f"{stage:<28} {freq:>6} {n_rows:>10,} filas  {seconds:9.4f} s  {peak_mb:9.1f} MB")
+    return results
+
+def run_weather_benchmark(n_locations=50, days=365, latency=0.1, error_rate=0.0, rate_limit=0.0,
+                          max_concurrency=api.MAX_CONCURRENCY, client_rate=api.RATE_LIMIT, seed=0, verbose=True):
+    """
+    Descarga el clima de n_locations ubicaciones (days días cada una) con api.fetch_histories
+    contra el servidor local de Open-Meteo, sin cache ni internet. rate_limit limita al
+    servidor (429); client_rate y max_concurrency son los límites del cliente.
+    """
+    from openmeteo_stub import OpenMeteoStub, StubConfig
+
+    start = pd.Timestamp("2023-01-01")
+    end = start + pd.Timedelta(days=days - 1)
+    locations = {
+        i: (-33.0 + 0.05 * i, -70.6, start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d"))
+        for i in range(n_locations)
+    }
+    config = StubConfig(latency=latency, error_rate=error_rate, rate_limit=rate_limit, seed=seed)
+    original_url = api.ARCHIVE_URL
+    with OpenMeteoStub(config) as stub:
+        api.ARCHIVE_URL = stub.url
+        try:
+            report = api.fetch_histories(locations, use_cache=False, max_concurrency=max_concurrency,
+                                         rate_limit=client_rate)
+        finally:
+            api.ARCHIVE_URL = original_url
+        server = stub.stats.as_dict()
+
+    result = {
+        "stage": "fetch_histories",
+        "rows": n_locations,
+        "freq": f"{days}D",
+        "seconds": report.elapsed,
+        "peak_mb": None,
+        "rows_per_second": n_locations / report.elapsed if report.elapsed > 0 else None,
+        "requests": report.requests,
+        "failed_locations": len(report.errors),
+        **{f"server_{k}": v for k, v in server.items()},
+    }
+    if verbose:
+        print(f"{'fetch_histories':<28} {n_locations:>6} ubicaciones  {report.elapsed:9.2f} s  "
+              f"{report.requests} consultas ({server['errores_inyectados']} errores inyectados, "
+              f"{server['limitadas']} limitadas), {len(report.errors)} ubicaciones fallidas")
+    return result
+
+def _git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def save_results(results, path):
+    payload = {
+        "revision": _git_revision(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "results": results,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2)
+
+def compare_results(results, baseline_path, tolerance=0.2):
+    """
+    Compara con un JSON anterior y lista las etapas más lentas que el umbral de tolerancia.
+    """
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {
+            (r["stage"], r["rows"], r["freq"]): r for r in json.load(f)["results"]
+        }
+    regressions = []
+    for r in results:
+        previous = baseline.get((r["stage"], r["rows"], r["freq"]))
+        if previous and previous["seconds"] > 0:
+            ratio = r["seconds"] / previous["seconds"]
+            if ratio > 1 + tolerance:
+                regressions.append({**r, "baseline_seconds": previous["seconds"], "ratio": ratio})
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks del pipeline de soiling")
+    parser.add_argument("--sizes", nargs="+", type=float, default=None, help="Cantidad de filas (ej. 1e3 1e5)")
+    parser.add_argument("--freqs", nargs="+", default=DEFAULT_FREQS, help="Resoluciones (ej. 1min 5min h)")
+    parser.add_argument("--stages", nargs="+", default=None, help="Etapas a medir (default: todas)")
+    parser.add_argument("--quick", action="store_true", help="Sólo tamaños hasta 10^5")
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticiones por medición")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="bench_results.json", help="Archivo JSON de salida")
+    parser.add_argument("--compare", default=None, help="JSON anterior para detectar regresiones")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Tolerancia de regresión (0.2 = 20%%)")
+    parser.add_argument("--clima", action="store_true", help="Medir también la descarga de clima (servidor local)")
+    parser.add_argument("--clima-ubicaciones", type=int, default=50, help="Ubicaciones a descargar")
+    parser.add_argument("--clima-dias", type=int, default=365, help="Días de clima por ubicación")
+    parser.add_argument("--clima-latencia", type=float, default=0.1, help="Latencia del servidor local (s)")
+    parser.add_argument("--clima-error-rate", type=float, default=0.0, help="Probabilidad de error del servidor")
+    parser.add_argument("--clima-rate-limit", type=float, default=0.0,
+                        help="Consultas por segundo que acepta el servidor (0 = sin límite)")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes] if args.sizes else (QUICK_SIZES if args.quick else DEFAULT_SIZES)
+    results = run_benchmarks(sizes, args.freqs, args.stages, args.repeat, args.seed)
+    if args.clima:
+        results.append(run_weather_benchmark(args.clima_ubicaciones, args.clima_dias, args.clima_latencia,
+                                             args.clima_error_rate, args.clima_rate_limit, seed=args.seed))
+    save_results(results, args.out)
+    print(f"Resultados guardados en {args.out}")
+
+    if args.compare:
+        regressions = compare_results(results, args.compare, args.tolerance)
+        for r in regressions:
+            print(f"REGRESIÓN {r['stage']} {r['freq']} {r['rows']:,} filas: "
+                  f"{r['baseline_seconds']:.4f} s → {r['seconds']:.4f} s (x{r['ratio']:.2f})")
+        if not regressions:
+            print("Sin regresiones respecto a la referencia")
+
+if __name__ == "__main__":
+    main()
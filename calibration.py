@@ -0,0 +1,227 @@
+"""
+Calibración de parámetros de Kimber y SOMOSclean contra el Soiling Ratio medido.
+
+Una grilla completa de parámetros se evalúa en bloque: los parámetros forman un eje y el
+tiempo el otro, así cada combinación se calcula con operaciones de arreglo sobre matrices
+(parámetros × tiempo). Luego el mejor punto de la grilla se refina con una búsqueda local
+por patrones (también evaluada en bloque) dentro de los límites de la grilla.
+"""
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from soiling_methods import (ROW_STEP_DAYS, _affine_scan, _somosclean_coefficients, _somosclean_factor,
+                             _sorted_by_time, daily_precipitation, elapsed_days)
+
+# Grillas por defecto (valores candidatos por parámetro)
+KIMBER_GRID = {
+    "soiling_rate": np.linspace(0.0005, 0.005, 10),
+    "cleaning_threshold": [5.0, 10.0, 15.0, 20.0, 25.0, 30.0],
+    "grace_period_days": [0, 5, 10, 15],
+    "max_soiling": [0.1, 0.2, 0.3],
+}
+SOMOSCLEAN_GRID = {
+    "delta_SL_sat": np.linspace(0.05, 0.35, 7),
+    "k": [5.0, 10.0, 15.0, 20.0, 30.0, 45.0, 60.0],
+    "heavy_rain_threshold": [2.0, 5.0, 10.0, 20.0],
+}
+DEFAULT_GRIDS = {"Kimber": KIMBER_GRID, "SOMOSclean": SOMOSCLEAN_GRID}
+
+# Máximo de celdas (parámetros × tiempo) por bloque para acotar la memoria
+MAX_CELLS = 5_000_000
+
+def _prepare_series(df, time_basis="transcurrido"):
+    """
+    Entradas del modelo y Soiling Ratio medido (escala 0-1), ordenados por fecha.
+    Los tiempos transcurridos se calculan por modelo (en modo "fila" cada uno avanza distinto por fila).
+    """
+    if df.empty:
+        raise ValueError("No hay datos para calibrar")
+    df = _sorted_by_time(df)
+    measured_col = 'Soiling Ratio Original' if 'Soiling Ratio Original' in df.columns else 'Soiling Ratio'
+    # Se calibra contra el nivel medido real (sin estirar su rango como en "Sin modelo");
+    # sólo se pasan a escala 0-1 los datos en porcentaje
+    measured = df[measured_col].astype(float)
+    if measured.max() > 10:
+        measured = measured / 100.0
+
+    precipitation = (df['precipitation'] if 'precipitation' in df.columns
+                     else pd.Series(0.0, index=df.index)).astype(float)
+    dates = df['DateTime'].dt.normalize()
+    precip_daily = daily_precipitation(df['DateTime'], precipitation, time_basis)
+    clima = df['Clima'].array if 'Clima' in df.columns else np.full(len(df), 'Sin datos', dtype=object)
+
+    # Límites de cada día (los datos están ordenados) para promediar por día
+    day_codes = dates.to_numpy()
+    day_starts = np.flatnonzero(np.r_[True, day_codes[1:] != day_codes[:-1]])
+
+    elapsed = {metodo: elapsed_days(df['DateTime'], time_basis, row_step=step)
+               for metodo, step in ROW_STEP_DAYS.items()}
+
+    return {
+        "elapsed": elapsed,
+        "forward": time_basis == "transcurrido",
+        "precipitation": precipitation.to_numpy(),
+        "precip_daily": precip_daily,
+        "clima": clima,
+        "measured": measured.to_numpy(dtype=float),
+        "day_starts": day_starts,
+    }
+
+def kimber_ratio_batch(precip_daily, elapsed, params, forward=True):
+    """
+    Soiling Ratio de Kimber para P combinaciones de parámetros: matriz (P, T).
+    elapsed: días transcurridos de cada registro (ver soiling_methods.elapsed_days).
+    forward: la gracia empieza en el registro siguiente al evento (modo "transcurrido").
+    """
+    n = len(precip_daily)
+    idx = np.arange(n)
+    threshold = np.asarray(params["cleaning_threshold"], dtype=float)[:, None]
+    rate = np.asarray(params["soiling_rate"], dtype=float)[:, None]
+    max_soiling = np.asarray(params["max_soiling"], dtype=float)[:, None]
+    grace = np.asarray(params["grace_period_days"], dtype=float)[:, None]
+
+    rain_event = precip_daily[None, :] >= threshold
+    last_event = np.maximum.accumulate(np.where(rain_event, idx, -1), axis=1)
+    reference = elapsed[np.minimum(np.maximum(last_event, 0) + int(forward), n - 1)]
+    active = np.where(last_event >= 0, elapsed - reference - grace, elapsed)
+    active = np.where(rain_event, 0.0, np.maximum(active, 0.0))
+    return 1 - np.minimum(active * rate, max_soiling)
+
+def somosclean_ratio_batch(clima, precipitation, elapsed, params, forward=True):
+    """
+    Soiling Ratio de SOMOSclean para P combinaciones de parámetros: matriz (P, T).
+    eqD sólo depende del umbral de lluvia intensa, así que se calcula una vez por umbral.
+    """
+    thresholds, inverse = np.unique(np.asarray(params["heavy_rain_threshold"], dtype=float), return_inverse=True)
+    f = np.stack([_somosclean_factor(clima, precipitation, t) for t in thresholds])
+    if forward:
+        # El clima de cada registro rige hasta el siguiente (como en calculate_somosclean_ratio)
+        f = np.concatenate((np.ones((len(thresholds), 1)), f[:, :-1]), axis=1)
+    a, b = _somosclean_coefficients(f, np.diff(elapsed, prepend=0.0))
+    eqD = _affine_scan(a, b)[inverse]
+    delta = np.asarray(params["delta_SL_sat"], dtype=float)[:, None]
+    k = np.asarray(params["k"], dtype=float)[:, None]
+    return 1 - delta * (1 - np.exp(-eqD / k))
+
+def _model_batch(metodo, series, params):
+    if metodo == "Kimber":
+        return kimber_ratio_batch(series["precip_daily"], series["elapsed"][metodo], params, series["forward"])
+    elif metodo == "SOMOSclean":
+        return somosclean_ratio_batch(series["clima"], series["precipitation"], series["elapsed"][metodo],
+                                      params, series["forward"])
+    raise ValueError(f"Método sin calibración: {metodo}")
+
+def _daily_mean(values, day_starts):
+    """
+    Promedio diario por fila (ignora NaN) usando los límites de cada día.
+    """
+    valid = ~np.isnan(values)
+    sums = np.add.reduceat(np.where(valid, values, 0.0), day_starts, axis=-1)
+    counts = np.add.reduceat(valid, day_starts, axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return sums / counts
+
+def _evaluate(metodo, series, params):
+    """
+    MAE y RMSE diarios de cada combinación de parámetros, evaluadas en bloques.
+    """
+    n_params = len(next(iter(params.values())))
+    n = len(series["measured"])
+    measured_daily = _daily_mean(series["measured"], series["day_starts"])
+    batch = max(1, MAX_CELLS // max(n, 1))
+
+    mae = np.empty(n_params)
+    rmse = np.empty(n_params)
+    for start in range(0, n_params, batch):
+        chunk = {name: np.asarray(values)[start:start + batch] for name, values in params.items()}
+        model_daily = _daily_mean(_model_batch(metodo, series, chunk), series["day_starts"])
+        error = model_daily - measured_daily[None, :]
+        mae[start:start + batch] = np.nanmean(np.abs(error), axis=1)
+        rmse[start:start + batch] = np.sqrt(np.nanmean(error ** 2, axis=1))
+    return mae, rmse
+
+def expand_grid(grid):
+    """
+    Producto cartesiano de la grilla: dict de arreglos con una entrada por combinación.
+    """
+    names = list(grid)
+    combos = np.array(list(itertools.product(*[np.asarray(grid[name], dtype=float) for name in names])))
+    return {name: combos[:, i] for i, name in enumerate(names)}
+
+def evaluate_grid(df, metodo, grid=None, time_basis="transcurrido"):
+    """
+    Superficie de error: una fila por combinación de parámetros con su MAE y RMSE diario.
+    """
+    grid = grid or DEFAULT_GRIDS[metodo]
+    series = _prepare_series(df, time_basis)
+    params = expand_grid(grid)
+    mae, rmse = _evaluate(metodo, series, params)
+    return pd.DataFrame({**params, "mae": mae, "rmse": rmse})
+
+def _refine(metodo, series, grid, best, max_iter=50, tol=1e-3):
+    """
+    Búsqueda local por patrones: en cada iteración evalúa en bloque los vecinos ±paso
+    de cada parámetro, se mueve al mejor y reduce el paso a la mitad si no hay mejora.
+    """
+    names = list(grid)
+    lower = np.array([np.min(grid[name]) for name in names], dtype=float)
+    upper = np.array([np.max(grid[name]) for name in names], dtype=float)
+    span = upper - lower
+    step = np.array([
+        np.diff(np.unique(grid[name])).min() / 2 if len(np.unique(grid[name])) > 1 else 0.0
+        for name in names
+    ])
+    point = np.array([best[name] for name in names], dtype=float)
+    best_rmse = best["rmse"]
+
+    for _ in range(max_iter):
+        if not np.any(step > tol * np.where(span > 0, span, 1)):
+            break
+        candidates = []
+        for i in range(len(names)):
+            if step[i] == 0:
+                continue
+            for sign in (-1, 1):
+                candidate = point.copy()
+                candidate[i] = np.clip(candidate[i] + sign * step[i], lower[i], upper[i])
+                candidates.append(candidate)
+        candidates = np.array(candidates)
+        params = {name: candidates[:, i] for i, name in enumerate(names)}
+        _, rmse = _evaluate(metodo, series, params)
+        i_best = int(np.nanargmin(rmse))
+        if rmse[i_best] < best_rmse:
+            point, best_rmse = candidates[i_best], rmse[i_best]
+        else:
+            step = step / 2
+
+    return dict(zip(names, point)), best_rmse
+
+def calibrate(df, metodo, grid=None, refine=True, time_basis="transcurrido"):
+    """
+    Ajusta los parámetros del método al Soiling Ratio medido.
+    Devuelve un dict con los mejores parámetros, su MAE/RMSE y la superficie de error de la grilla.
+    time_basis debe coincidir con el que se usará al aplicar el modelo.
+    """
+    grid = grid or DEFAULT_GRIDS[metodo]
+    series = _prepare_series(df, time_basis)
+    params = expand_grid(grid)
+    mae, rmse = _evaluate(metodo, series, params)
+    superficie = pd.DataFrame({**params, "mae": mae, "rmse": rmse})
+
+    i_best = int(np.nanargmin(rmse))
+    best = superficie.iloc[i_best].to_dict()
+    best_params = {name: best[name] for name in grid}
+    if refine:
+        best_params, _ = _refine(metodo, series, grid, best)
+
+    final = {name: np.array([value]) for name, value in best_params.items()}
+    best_mae, best_rmse = _evaluate(metodo, series, final)
+    return {
+        "metodo": metodo,
+        "parametros": {name: float(value) for name, value in best_params.items()},
+        "mae": float(best_mae[0]),
+        "rmse": float(best_rmse[0]),
+        "superficie": superficie,
+    }
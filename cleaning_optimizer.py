@@ -0,0 +1,150 @@
+"""
+Calendario de limpiezas de costo mínimo.
+
+A partir de la trayectoria diaria de Soiling Ratio del modelo, el costo de una limpieza y el
+precio de la energía busca las fechas de limpieza que minimizan limpiezas + energía perdida,
+con programación dinámica sobre arreglos (O(días × horizonte)), y lo compara con la
+frecuencia fija que sugieren las recomendaciones (soiling_methods.frecuencia_limpieza).
+
+Modelo de pérdida: sin limpiezas manuales la pérdida diaria es la del modelo, 1 - SR.
+Una limpieza al inicio del día j la lleva a cero y desde ahí se vuelve a acumular con los
+aumentos diarios de pérdida del modelo; las lluvias siguen limpiando, así que la pérdida
+nunca supera la de la trayectoria sin limpiezas. Pasados `horizon` días desde la última
+limpieza se supone que su efecto se perdió y la pérdida vuelve a ser la del modelo.
+Los valores por defecto corresponden a 1 MWp instalado.
+"""
+import numpy as np
+
+from soiling_methods import frecuencia_limpieza
+
+DEFAULT_CLEANING_COST = 200.0    # Costo de una limpieza (moneda por MWp)
+DEFAULT_ENERGY_PRICE = 0.06      # Precio de la energía (moneda por kWh)
+DEFAULT_DAILY_ENERGY_KWH = 4500  # Energía diaria sin soiling (kWh por MWp)
+DEFAULT_HORIZON_DAYS = 120       # Días que se sigue el efecto de una limpieza
+
+def daily_loss(daily_stats):
+    """
+    Fechas y pérdida diaria (1 - SR, entre 0 y 1) en un calendario continuo:
+    los días sin datos se interpolan entre los vecinos.
+    """
+    sr = daily_stats.set_index('Date')['Soiling Ratio'].astype(float)
+    sr = sr.asfreq('D').interpolate(limit_direction='both').fillna(1.0)
+    return sr.index, np.clip(1.0 - sr.to_numpy(), 0.0, 1.0)
+
+def _cost_tables(loss, value, horizon):
+    """
+    Tablas del costo de la energía perdida.
+    natural[k]: días [0, k) sin limpiezas manuales (largo T + 1).
+    after[j, h]: primeros h días desde una limpieza el día j (h = 0..horizon; pasado el
+    final de la serie el costo no aumenta).
+    """
+    n = len(loss)
+    natural = np.concatenate(([0.0], np.cumsum(loss * value)))
+    deposited = np.concatenate(([0.0], np.cumsum(np.maximum(np.diff(loss), 0.0))))
+
+    days = np.arange(n)[:, None] + np.arange(horizon)[None, :]
+    inside = days < n
+    days = np.minimum(days, n - 1)
+    regrowth = np.minimum(loss[days], deposited[days] - deposited[:, None])
+    daily = np.where(inside, regrowth * value[days], 0.0)
+    after = np.zeros((n, horizon + 1))
+    np.cumsum(daily, axis=1, out=after[:, 1:])
+    return natural, after
+
+def _segment_cost(natural, after, start, end, horizon):
+    """
+    Costo de la energía perdida en los días [start, end) tras una limpieza el día start.
+    """
+    if end - start <= horizon:
+        return after[start, end - start]
+    return after[start, horizon] + natural[end] - natural[start + horizon]
+
+def schedule_cost(natural, after, cleanings, cleaning_cost, horizon):
+    """
+    Costo total (limpiezas + energía perdida) de limpiar en los días `cleanings` (ordenados).
+    """
+    n = len(natural) - 1
+    if not len(cleanings):
+        return natural[n]
+    cost = natural[cleanings[0]] + cleaning_cost * len(cleanings)
+    for start, end in zip(cleanings, [*cleanings[1:], n]):
+        cost += _segment_cost(natural, after, start, end, horizon)
+    return cost
+
+def optimal_schedule(natural, after, cleaning_cost, horizon):
+    """
+    Días de limpieza de costo total mínimo y ese costo.
+
+    best[j] es el costo mínimo de los días [0, j) más la limpieza del día j. La limpieza
+    anterior es: ninguna (pérdida natural hasta j), un día i a menos de `horizon` días
+    (after[i, j - i]) o uno más lejano, cuyo mejor valor se lleva como mínimo acumulado.
+    """
+    n = len(natural) - 1
+    best = np.empty(n)
+    prev = np.full(n, -1)
+    far_best, far_arg = np.inf, -1
+    offsets = np.arange(1, horizon + 1)
+
+    def choose(j):
+        # Mejor costo de los días [0, j) terminando con la pérdida que deja la última limpieza
+        nonlocal far_best, far_arg
+        if j >= horizon:
+            i = j - horizon
+            candidate = best[i] + after[i, horizon] - natural[i + horizon]
+            if candidate < far_best:
+                far_best, far_arg = candidate, i
+        cost, arg = natural[j], -1
+        if far_best + natural[j] < cost:
+            cost, arg = far_best + natural[j], far_arg
+        if j:
+            near = offsets[:min(j, horizon)]
+            starts = j - near
+            totals = best[starts] + after[starts, near]
+            k = int(np.argmin(totals))
+            if totals[k] < cost:
+                cost, arg = totals[k], int(starts[k])
+        return cost, arg
+
+    for j in range(n):
+        cost, prev[j] = choose(j)
+        best[j] = cost + cleaning_cost
+    total, last = choose(n)
+
+    cleanings = []
+    while last >= 0:
+        cleanings.append(last)
+        last = prev[last]
+    return cleanings[::-1], float(total)
+
+def optimize_cleaning_schedule(daily_stats, metodo, cleaning_cost=DEFAULT_CLEANING_COST,
+                               energy_price=DEFAULT_ENERGY_PRICE, daily_energy_kwh=DEFAULT_DAILY_ENERGY_KWH,
+                               horizon=DEFAULT_HORIZON_DAYS):
+    """
+    Calendario óptimo de limpiezas para el período de daily_stats (utils.build_daily_stats)
+    y su ahorro frente a limpiar cada N días, con N el centro del rango recomendado.
+    daily_energy_kwh puede ser un valor o un arreglo con la energía de cada día del calendario.
+    """
+    dates, loss = daily_loss(daily_stats)
+    n = len(loss)
+    horizon = max(1, min(int(horizon), n))
+    value = np.broadcast_to(np.asarray(daily_energy_kwh, dtype=float) * energy_price, (n,))
+    natural, after = _cost_tables(loss, value, horizon)
+
+    cleanings, optimal_cost = optimal_schedule(natural, after, cleaning_cost, horizon)
+
+    rango = frecuencia_limpieza(daily_stats, metodo)
+    interval = (rango[0] + rango[1]) // 2
+    heuristic = list(range(interval, n, interval))
+    heuristic_cost = float(schedule_cost(natural, after, heuristic, cleaning_cost, horizon))
+
+    return {
+        "fechas": [dates[j] for j in cleanings],
+        "n_limpiezas": len(cleanings),
+        "costo_optimo": optimal_cost,
+        "costo_sin_limpieza": float(natural[n]),
+        "intervalo_heuristica": interval,
+        "limpiezas_heuristica": len(heuristic),
+        "costo_heuristica": heuristic_cost,
+        "ahorro": heuristic_cost - optimal_cost,
+        "dias": n,
+    }
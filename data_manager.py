@@ -1,27 +1,194 @@
-import pandas as pd
+"""
+Registro de proyectos (nombre, latitud y longitud) en SQLite.
+
+Reemplaza a ubi/ubicaciones.xlsx como fuente de verdad: cada alta, modificación o baja es
+una sentencia atómica sobre la fila del proyecto (dos usuarios editando a la vez no se pisan)
+y la lectura se sirve desde memoria mientras el registro no cambie. El Excel se puede
+importar y exportar; al crearse, el registro importa ubicaciones.xlsx de su mismo directorio.
+"""
 import os
+import sqlite3
+import threading
+import warnings
 
-def load_ubicaciones(path):
-    if os.path.exists(path):
-        df = pd.read_excel(path)
-        df.columns = [col.strip() for col in df.columns]
-        df = df.drop_duplicates(subset="Proyecto", keep="first")
-        return df
-    else:
-        return pd.DataFrame(columns=["Proyecto", "Latitud", "Longitud"])
+import pandas as pd
+
+# Ubicación del registro (se puede cambiar con la variable de entorno SOILING_REGISTRY)
+DEFAULT_REGISTRY_PATH = os.environ.get(
+    "SOILING_REGISTRY",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "ubi", "proyectos.sqlite"),
+)
+EXCEL_NAME = "ubicaciones.xlsx"
+COLUMNS = ["Proyecto", "Latitud", "Longitud"]
+
+# La versión sube con cada cambio (triggers), así la lectura sabe si su copia sigue vigente
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS proyectos (
+    proyecto TEXT PRIMARY KEY,
+    latitud REAL NOT NULL,
+    longitud REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS registro (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO registro VALUES (1, 0);
+CREATE TRIGGER IF NOT EXISTS proyectos_insert AFTER INSERT ON proyectos
+    BEGIN UPDATE registro SET version = version + 1; END;
+CREATE TRIGGER IF NOT EXISTS proyectos_update AFTER UPDATE ON proyectos
+    BEGIN UPDATE registro SET version = version + 1; END;
+CREATE TRIGGER IF NOT EXISTS proyectos_delete AFTER DELETE ON proyectos
+    BEGIN UPDATE registro SET version = version + 1; END;
+"""
+
+_local = threading.local()
+_frames = {}
+_frames_lock = threading.Lock()
+
+def _connect(path):
+    """
+    Conexión del hilo actual al registro (se reutiliza entre llamadas).
+    Si el registro no existía se crea y se importa el Excel de su directorio.
+    """
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(path)
+    if conn is None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        with conn:
+            conn.executescript(_SCHEMA)
+            nuevo = conn.execute("SELECT version FROM registro").fetchone()[0] == 0
+        excel_path = os.path.join(os.path.dirname(path), EXCEL_NAME)
+        if nuevo and os.path.exists(excel_path):
+            _upsert(conn, read_ubicaciones_excel(excel_path))
+        connections[path] = conn
+    return conn
+
+def _upsert(conn, df, replace=False):
+    """
+    Inserta o actualiza las filas de df en una sola transacción (con replace borra el resto).
+    Las filas sin nombre se ignoran; las que no tienen coordenadas numéricas se omiten con un
+    aviso (con replace, si el proyecto ya estaba registrado conserva su ubicación anterior).
+    Devuelve la cantidad de proyectos guardados.
+    """
+    nombres = df['Proyecto'].astype(object)
+    named = nombres.notna() & (nombres.astype(str) != "")
+    lat = pd.to_numeric(df['Latitud'], errors='coerce')
+    lon = pd.to_numeric(df['Longitud'], errors='coerce')
+    valid = named & lat.notna() & lon.notna()
+    skipped = nombres[named & ~valid].astype(str).tolist()
+    if skipped:
+        warnings.warn(f"Proyectos sin coordenadas válidas, no se guardan: {', '.join(skipped)}")
 
-def save_ubicaciones(df, path):
-    df.to_excel(path, index=False)
+    rows = [(str(nombre), float(la), float(lo))
+            for nombre, la, lo in zip(nombres[valid], lat[valid], lon[valid])]
+    with conn:
+        if replace:
+            keep = {str(nombre) for nombre in nombres[named]}
+            registered = [nombre for (nombre,) in conn.execute("SELECT proyecto FROM proyectos")]
+            conn.executemany("DELETE FROM proyectos WHERE proyecto = ?",
+                             [(nombre,) for nombre in registered if nombre not in keep])
+        conn.executemany(
+            "INSERT INTO proyectos VALUES (?, ?, ?) "
+            "ON CONFLICT(proyecto) DO UPDATE SET latitud = excluded.latitud, longitud = excluded.longitud",
+            rows,
+        )
+    return len(rows)
 
-def add_proyecto(df, nombre, lat, lon):
-    if nombre and not df["Proyecto"].eq(nombre).any():
-        new_row = pd.DataFrame([{"Proyecto": nombre, "Latitud": lat, "Longitud": lon}])
-        return pd.concat([df, new_row], ignore_index=True)
-    return df
+def read_ubicaciones_excel(path):
+    """
+    Lee un Excel de ubicaciones (columnas Proyecto, Latitud, Longitud).
+    """
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=COLUMNS)
+    df = pd.read_excel(path)
+    df.columns = [col.strip() for col in df.columns]
+    return df.drop_duplicates(subset="Proyecto", keep="first")
 
-def update_proyecto(df, nombre, lat, lon):
-    df.loc[df["Proyecto"] == nombre, ["Latitud", "Longitud"]] = [lat, lon]
-    return df
+def registry_version(path=DEFAULT_REGISTRY_PATH):
+    """
+    Contador de cambios del registro (sirve como clave de cache).
+    """
+    return _connect(path).execute("SELECT version FROM registro").fetchone()[0]
 
-def delete_proyecto(df, nombre):
-    return df[df["Proyecto"] != nombre]
+def load_ubicaciones(path=DEFAULT_REGISTRY_PATH):
+    """
+    Todos los proyectos en orden de alta (DataFrame Proyecto, Latitud, Longitud).
+    Acepta también la ruta de un Excel de ubicaciones.
+    Mientras el registro no cambie se devuelve una copia del último resultado leído.
+    """
+    if path.endswith(".xlsx"):
+        return read_ubicaciones_excel(path)
+    version = registry_version(path)
+    with _frames_lock:
+        cached = _frames.get(path)
+    if cached is None or cached[0] != version:
+        rows = _connect(path).execute(
+            "SELECT proyecto, latitud, longitud FROM proyectos ORDER BY rowid").fetchall()
+        cached = (version, pd.DataFrame(rows, columns=COLUMNS))
+        with _frames_lock:
+            _frames[path] = cached
+    return cached[1].copy()
+
+def get_proyecto(nombre, path=DEFAULT_REGISTRY_PATH):
+    """
+    Datos de un proyecto ({"Proyecto", "Latitud", "Longitud"}) o None si no existe.
+    """
+    row = _connect(path).execute(
+        "SELECT proyecto, latitud, longitud FROM proyectos WHERE proyecto = ?", (nombre,)).fetchone()
+    return dict(zip(COLUMNS, row)) if row is not None else None
+
+def add_proyecto(nombre, lat, lon, path=DEFAULT_REGISTRY_PATH):
+    """
+    Agrega un proyecto. Devuelve False si el nombre está vacío o ya existe.
+    """
+    if not nombre:
+        return False
+    conn = _connect(path)
+    with conn:
+        cursor = conn.execute("INSERT OR IGNORE INTO proyectos VALUES (?, ?, ?)", (nombre, float(lat), float(lon)))
+    return cursor.rowcount == 1
+
+def update_proyecto(nombre, lat, lon, path=DEFAULT_REGISTRY_PATH):
+    """
+    Cambia la ubicación de un proyecto. Devuelve False si no existe.
+    """
+    conn = _connect(path)
+    with conn:
+        cursor = conn.execute("UPDATE proyectos SET latitud = ?, longitud = ? WHERE proyecto = ?",
+                              (float(lat), float(lon), nombre))
+    return cursor.rowcount == 1
+
+def delete_proyecto(nombre, path=DEFAULT_REGISTRY_PATH):
+    """
+    Elimina un proyecto. Devuelve False si no existe.
+    """
+    conn = _connect(path)
+    with conn:
+        cursor = conn.execute("DELETE FROM proyectos WHERE proyecto = ?", (nombre,))
+    return cursor.rowcount == 1
+
+def import_excel(excel_path, path=DEFAULT_REGISTRY_PATH, replace=False):
+    """
+    Importa un Excel de ubicaciones: agrega los proyectos nuevos y actualiza los existentes
+    (con replace el registro queda igual al Excel). Devuelve la cantidad de filas importadas.
+    """
+    return _upsert(_connect(path), read_ubicaciones_excel(excel_path), replace)
+
+def export_excel(excel_path, path=DEFAULT_REGISTRY_PATH):
+    """
+    Exporta el registro a un Excel con el formato de ubicaciones.xlsx.
+    """
+    load_ubicaciones(path).to_excel(excel_path, index=False)
+
+def save_ubicaciones(df, path=DEFAULT_REGISTRY_PATH):
+    """
+    Reemplaza todos los proyectos por los de df (o escribe el Excel si path es .xlsx).
+    """
+    if path.endswith(".xlsx"):
+        df.to_excel(path, index=False)
+    else:
+        _upsert(_connect(path), df, replace=True)
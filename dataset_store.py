@@ -0,0 +1,138 @@
+"""
+Almacén columnar de datos procesados (limpios y con clima) en Parquet.
+
+El dataset se particiona por Proyecto y mes (Proyecto=<nombre>/mes=<AAAA-MM>/), de modo
+que al leer un rango de fechas sólo se abren los meses necesarios y sólo las columnas pedidas.
+"""
+import os
+from urllib.parse import quote, unquote
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from api import CLIMA_DTYPE
+
+# Ubicación del almacén (se puede cambiar con la variable de entorno SOILING_DATASET_STORE)
+DEFAULT_STORE_PATH = os.environ.get(
+    "SOILING_DATASET_STORE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "store", "dataset"),
+)
+STORE_COLUMNS = ['DateTime', 'Soiling Ratio', 'Clima', 'precipitation', 'cloudcover']
+
+_PARTITIONING = ds.partitioning(
+    pa.schema([("Proyecto", pa.string()), ("mes", pa.string())]), flavor="hive"
+)
+
+def _dataset(path):
+    return ds.dataset(path, format="parquet", partitioning=_PARTITIONING)
+
+def _month(value):
+    return pd.Timestamp(value).strftime("%Y-%m")
+
+def _project_dir(proyecto, path):
+    # pyarrow codifica los valores de partición como URI (ej. espacios -> %20)
+    return os.path.join(path, f"Proyecto={quote(str(proyecto), safe='')}")
+
+def list_projects(path=DEFAULT_STORE_PATH):
+    """
+    Proyectos con datos guardados.
+    """
+    if not os.path.isdir(path):
+        return []
+    return sorted(
+        unquote(name.split("=", 1)[1]) for name in os.listdir(path)
+        if name.startswith("Proyecto=")
+    )
+
+def list_months(proyecto, path=DEFAULT_STORE_PATH):
+    """
+    Meses (AAAA-MM) guardados para un proyecto, sin leer los archivos.
+    """
+    project_dir = _project_dir(proyecto, path)
+    if not os.path.isdir(project_dir):
+        return []
+    return sorted(
+        name.split("=", 1)[1] for name in os.listdir(project_dir)
+        if name.startswith("mes=")
+    )
+
+def project_version(proyecto, path=DEFAULT_STORE_PATH):
+    """
+    Marca de la última escritura del proyecto (sirve como clave de cache).
+    """
+    project_dir = _project_dir(proyecto, path)
+    latest = 0.0
+    for root, _, files in os.walk(project_dir):
+        for name in files:
+            latest = max(latest, os.path.getmtime(os.path.join(root, name)))
+    return latest
+
+def read_project(proyecto, start_date=None, end_date=None, columns=None, path=DEFAULT_STORE_PATH):
+    """
+    Lee los datos guardados de un proyecto.
+    Sólo abre las particiones de los meses dentro de [start_date, end_date] y sólo las columnas pedidas.
+    """
+    columns = list(columns or STORE_COLUMNS)
+    if 'DateTime' not in columns:
+        columns = ['DateTime'] + columns
+    if proyecto not in list_projects(path):
+        return pd.DataFrame(columns=columns)
+
+    condition = ds.field("Proyecto") == proyecto
+    if start_date is not None:
+        condition &= ds.field("mes") >= _month(start_date)
+    if end_date is not None:
+        condition &= ds.field("mes") <= _month(end_date)
+
+    table = _dataset(path).to_table(columns=columns, filter=condition)
+    df = table.to_pandas().sort_values('DateTime', ignore_index=True)
+    # Mismos tipos compactos que la ingesta y el cruce con clima
+    for column in ['Soiling Ratio', 'precipitation', 'cloudcover']:
+        if column in df.columns:
+            df[column] = df[column].astype(np.float32)
+    if 'Clima' in df.columns:
+        df['Clima'] = df['Clima'].astype(CLIMA_DTYPE)
+
+    # Recorte fino dentro de los meses de los extremos
+    if start_date is not None:
+        df = df[df['DateTime'] >= pd.Timestamp(start_date)]
+    if end_date is not None:
+        df = df[df['DateTime'] < pd.Timestamp(end_date) + pd.Timedelta(days=1)]
+    return df.reset_index(drop=True)
+
+def write_project(df, proyecto, path=DEFAULT_STORE_PATH):
+    """
+    Guarda los datos de un proyecto. Los meses presentes en df se combinan con lo ya
+    guardado (ante un mismo DateTime gana el dato nuevo); los demás meses no se tocan.
+    """
+    if df.empty:
+        return
+    columns = [c for c in STORE_COLUMNS if c in df.columns]
+    new = df[columns].copy()
+
+    months = new['DateTime'].dt.strftime("%Y-%m")
+    # Los meses escritos se reemplazan completos: se leen enteros para no perder datos
+    first_day = pd.Timestamp(months.min() + "-01")
+    last_day = pd.Timestamp(months.max() + "-01") + pd.offsets.MonthEnd(0)
+    existing = read_project(proyecto, first_day, last_day, columns, path)
+    if not existing.empty:
+        existing = existing[existing['DateTime'].dt.strftime("%Y-%m").isin(set(months))]
+        new = pd.concat([existing, new], ignore_index=True)
+        new = new.drop_duplicates(subset='DateTime', keep='last')
+    new = new.sort_values('DateTime', ignore_index=True)
+
+    new['Proyecto'] = proyecto
+    new['mes'] = new['DateTime'].dt.strftime("%Y-%m")
+    if 'Clima' in new.columns:
+        new['Clima'] = new['Clima'].astype(str)
+
+    ds.write_dataset(
+        pa.Table.from_pandas(new, preserve_index=False),
+        path,
+        format="parquet",
+        partitioning=_PARTITIONING,
+        basename_template="part-{i}.parquet",
+        existing_data_behavior="delete_matching",
+    )
@@ -0,0 +1,95 @@
+"""
+Reducción de puntos para gráficos de series largas.
+
+Antes de enviar una serie a Plotly se eligen como máximo `max_points` puntos que conservan
+la forma de la curva: LTTB (Largest-Triangle-Three-Buckets) o mínimo/máximo por tramo.
+La app reduce los datos ya recortados al rango de fechas elegido, así que al acotar
+el rango se recupera el detalle completo.
+"""
+import numpy as np
+import pandas as pd
+
+MAX_POINTS = 3000        # Puntos por serie enviados al navegador
+WEBGL_THRESHOLD = 1500   # Sobre esta cantidad de puntos se dibuja con WebGL (Scattergl)
+
+def _numeric_x(x):
+    """
+    Eje X como números (fechas → nanosegundos; texto → posición) para medir áreas y rangos.
+    """
+    x = pd.Series(x)
+    if pd.api.types.is_numeric_dtype(x):
+        return x.to_numpy(dtype=float)
+    if not pd.api.types.is_datetime64_any_dtype(x):
+        converted = pd.to_datetime(x, errors='coerce')
+        if converted.isna().any():
+            return np.arange(len(x), dtype=float)
+        x = converted
+    return x.to_numpy(dtype='datetime64[ns]').astype(np.int64).astype(float)
+
+def lttb_indices(x, y, n_out):
+    """
+    Índices elegidos por LTTB: el primero, el último y en cada tramo intermedio el punto
+    que forma el triángulo de mayor área con el punto anterior elegido y el promedio del tramo siguiente.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    # Promedio de cada tramo (el último "tramo siguiente" es el punto final)
+    sums_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1)
+    counts = np.diff(edges)
+    avg_x = np.append(sums_x / counts, x[-1])
+    avg_y = np.append(sums_y / counts, y[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    prev = 0
+    for b in range(n_out - 2):
+        lo, hi = edges[b], edges[b + 1]
+        area = np.abs(
+            (x[prev] - avg_x[b + 1]) * (y[lo:hi] - y[prev])
+            - (x[prev] - x[lo:hi]) * (avg_y[b + 1] - y[prev])
+        )
+        prev = lo + int(np.argmax(area))
+        selected[b + 1] = prev
+    return selected
+
+def minmax_indices(y, n_buckets):
+    """
+    Índices del mínimo y del máximo de cada tramo (conserva picos y valles), en orden.
+    """
+    n = len(y)
+    if 2 * n_buckets >= n:
+        return np.arange(n)
+    bucket = (np.arange(n) * n_buckets) // n
+    first = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    last = np.r_[first[1:], n] - 1
+    # Orden por (tramo, valor): el primero de cada tramo es el mínimo y el último el máximo
+    order = np.lexsort((y, bucket))
+    return np.unique(np.concatenate([order[first], order[last]]))
+
+def downsample(data, x_column, y_columns, max_points=MAX_POINTS, method="lttb"):
+    """
+    Reduce `data` (ordenado por x_column) a unas `max_points` filas.
+    Con varias series el presupuesto se reparte y se conserva la unión de los puntos
+    elegidos para cada una, de modo que todas comparten el mismo eje X.
+    """
+    if isinstance(y_columns, str):
+        y_columns = [y_columns]
+    if len(data) <= max_points:
+        return data
+
+    x = _numeric_x(data[x_column])
+    budget = max(3, max_points // len(y_columns))
+    keep = []
+    for column in y_columns:
+        y = data[column].to_numpy(dtype=float)
+        valid = np.flatnonzero(~np.isnan(y))
+        if method == "minmax":
+            chosen = minmax_indices(y[valid], budget // 2)
+        else:
+            chosen = lttb_indices(x[valid], y[valid], budget)
+        keep.append(valid[chosen])
+    return data.iloc[np.unique(np.concatenate(keep))]
@@ -0,0 +1,116 @@
+"""
+Resumen por proyecto y método para la vista de flota.
+
+Las corridas batch guardan aquí los indicadores de cada proyecto (SR actual, pérdida,
+días bajo el umbral, última limpieza) en una tabla SQLite junto al registro de proyectos.
+La vista de flota sólo lee esta tabla: no recalcula nada, así que su costo no depende
+del tamaño de los datos de cada planta.
+"""
+import os
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from data_manager import DEFAULT_REGISTRY_PATH, load_ubicaciones
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS resumen_proyectos (
+    proyecto TEXT NOT NULL,
+    metodo TEXT NOT NULL,
+    sr_actual REAL,
+    sr_promedio REAL,
+    perdida REAL,
+    dias_bajo_umbral INTEGER,
+    dias_analizados INTEGER,
+    estado TEXT,
+    ultima_limpieza TEXT,
+    ultimo_dato TEXT,
+    umbral REAL,
+    actualizado TEXT NOT NULL,
+    error TEXT,
+    PRIMARY KEY (proyecto, metodo)
+);
+"""
+
+# Columnas de la tabla -> claves de las filas del resumen de batch_runner
+_FIELDS = {
+    "sr_actual": "SR Actual",
+    "sr_promedio": "SR Promedio",
+    "perdida": "Perdida (%)",
+    "dias_bajo_umbral": "Dias bajo umbral",
+    "dias_analizados": "Dias analizados",
+    "estado": "Estado",
+    "ultima_limpieza": "Ultima limpieza",
+    "ultimo_dato": "Ultimo dato",
+    "umbral": "Umbral",
+}
+
+def _connect(path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+def _value(value):
+    """
+    Valor apto para SQLite (escalares de numpy a tipos de Python, NaN a NULL).
+    """
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    return value.item() if isinstance(value, np.generic) else value
+
+def store_results(rows, path=DEFAULT_REGISTRY_PATH, now=None):
+    """
+    Guarda filas del resumen de batch_runner (una por proyecto y método).
+    Una fila con error sólo registra el error: se conservan los indicadores de la última corrida exitosa.
+    """
+    now = (now or datetime.now()).isoformat(timespec="seconds")
+    ok, failed = [], []
+    for row in rows:
+        if not row.get("Metodo"):
+            continue
+        if row.get("error"):
+            failed.append((row["Proyecto"], row["Metodo"], now, row["error"]))
+        else:
+            ok.append((row["Proyecto"], row["Metodo"], *(_value(row.get(k)) for k in _FIELDS.values()), now))
+
+    columns = ", ".join(_FIELDS)
+    updates = ", ".join(f"{c} = excluded.{c}" for c in _FIELDS)
+    with closing(_connect(path)) as conn, conn:
+        conn.executemany(
+            f"INSERT INTO resumen_proyectos (proyecto, metodo, {columns}, actualizado, error) "
+            f"VALUES (?, ?, {', '.join('?' * len(_FIELDS))}, ?, NULL) "
+            f"ON CONFLICT(proyecto, metodo) DO UPDATE SET {updates}, actualizado = excluded.actualizado, error = NULL",
+            ok,
+        )
+        conn.executemany(
+            "INSERT INTO resumen_proyectos (proyecto, metodo, actualizado, error) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(proyecto, metodo) DO UPDATE SET actualizado = excluded.actualizado, error = excluded.error",
+            failed,
+        )
+
+def load_fleet_summary(metodo, path=DEFAULT_REGISTRY_PATH):
+    """
+    Una fila por proyecto del registro con los indicadores guardados para `metodo`
+    (vacíos si el proyecto todavía no pasó por una corrida batch).
+    """
+    with closing(_connect(path)) as conn:
+        summary = pd.read_sql_query(
+            "SELECT * FROM resumen_proyectos WHERE metodo = ?", conn, params=(metodo,))
+    summary = summary.drop(columns="metodo").rename(columns={"proyecto": "Proyecto", **_FIELDS,
+                                                             "actualizado": "Actualizado", "error": "Error"})
+    fleet = load_ubicaciones(path).merge(summary, on="Proyecto", how="left")
+    for column in ["Ultima limpieza", "Ultimo dato", "Actualizado"]:
+        fleet[column] = pd.to_datetime(fleet[column])
+    return fleet
+
+def summary_methods(path=DEFAULT_REGISTRY_PATH):
+    """
+    Métodos con resultados guardados.
+    """
+    with closing(_connect(path)) as conn:
+        return [m for (m,) in conn.execute("SELECT DISTINCT metodo FROM resumen_proyectos ORDER BY metodo")]
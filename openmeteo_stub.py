@@ -0,0 +1,285 @@
+"""
+Servidor local que reemplaza al archivo histórico de Open-Meteo.
+
+Permite probar y medir api.py sin conexión a internet. Modos:
+- "sintetico": responde con clima horario sintético determinista (benchmark.generate_weather).
+- "replay": responde con las respuestas guardadas en el directorio de fixtures.
+- "record": reenvía cada consulta a Open-Meteo y guarda la respuesta como fixture.
+Se puede agregar latencia, errores al azar y un límite de consultas por segundo (429).
+
+Uso:
+    python openmeteo_stub.py --modo sintetico --latencia 0.2 --error-rate 0.1 --rate-limit 10
+    OPENMETEO_ARCHIVE_URL=http://127.0.0.1:8085/v1/archive streamlit run streamlit_app.py
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+import zlib
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+import requests
+
+from benchmark import generate_weather
+
+DEFAULT_PORT = 8085
+ARCHIVE_PATH = "/v1/archive"
+UPSTREAM_URL = "https://archive-api.open-meteo.com/v1/archive"
+DEFAULT_FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "openmeteo")
+MODOS = ["sintetico", "replay", "record"]
+
+@dataclass
+class StubConfig:
+    """
+    Configuración del servidor.
+    latency: segundos fijos por respuesta, más un extra al azar de hasta jitter segundos.
+    error_rate: probabilidad de responder error_status en lugar de los datos.
+    rate_limit: consultas por segundo aceptadas (0 = sin límite); el resto recibe 429.
+    """
+    modo: str = "sintetico"
+    fixtures_dir: str = DEFAULT_FIXTURES
+    upstream_url: str = UPSTREAM_URL
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 503
+    rate_limit: float = 0.0
+    seed: int = 0
+
+@dataclass
+class StubStats:
+    """
+    Contadores de lo que respondió el servidor.
+    """
+    consultas: int = 0
+    ok: int = 0
+    errores_inyectados: int = 0
+    limitadas: int = 0
+    sin_fixture: int = 0
+    errores_upstream: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def as_dict(self):
+        with self._lock:
+            return {k: v for k, v in vars(self).items() if not k.startswith("_")}
+
+def fixture_name(params):
+    """
+    Nombre del archivo de fixture para una consulta (ubicación y rango de fechas).
+    """
+    lat = float(params["latitude"])
+    lon = float(params["longitude"])
+    return f"{lat:.4f}_{lon:.4f}_{params['start_date']}_{params['end_date']}.json"
+
+def synthetic_response(params, seed=0):
+    """
+    Respuesta con el formato de Open-Meteo y clima sintético determinista por ubicación y rango.
+    """
+    location_seed = zlib.crc32(f"{float(params['latitude']):.4f},{float(params['longitude']):.4f}".encode())
+    # Open-Meteo entrega todas las horas de end_date (hasta las 23:00)
+    end = pd.Timestamp(params["end_date"]) + pd.Timedelta(days=1)
+    weather = generate_weather(params["start_date"], end, seed + location_seed)
+    weather = weather[weather["time"] < end]
+    return {
+        "latitude": float(params["latitude"]),
+        "longitude": float(params["longitude"]),
+        "timezone": params.get("timezone", "GMT"),
+        "hourly": {
+            "time": weather["time"].dt.strftime("%Y-%m-%dT%H:%M").tolist(),
+            "temperature_2m": weather["temperature"].tolist(),
+            "precipitation": weather["precipitation"].tolist(),
+            "cloudcover": weather["cloudcover"].tolist(),
+        },
+    }
+
+class _RateLimiter:
+    """
+    Cubeta de fichas: admite ráfagas de hasta `rate` consultas y `rate` por segundo en promedio.
+    """
+    def __init__(self, rate):
+        self.rate = rate
+        self._tokens = rate
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def allow(self):
+        if not self.rate:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+def _make_handler(config, stats, limiter, rng):
+    rng_lock = threading.Lock()
+
+    def draw():
+        with rng_lock:
+            return rng.random()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send_json(self, status, payload, headers=None):
+            body = json.dumps(payload).encode() if not isinstance(payload, bytes) else payload
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/stats":
+                self._send_json(200, stats.as_dict())
+                return
+            if url.path != ARCHIVE_PATH:
+                self._send_json(404, {"error": True, "reason": f"Ruta desconocida: {url.path}"})
+                return
+
+            stats.add("consultas")
+            params = {k: v[0] for k, v in parse_qs(url.query).items()}
+            if not limiter.allow():
+                stats.add("limitadas")
+                self._send_json(429, {"error": True, "reason": "Too many requests"}, {"Retry-After": "1"})
+                return
+
+            delay = config.latency + (draw() * config.jitter if config.jitter else 0.0)
+            if delay > 0:
+                time.sleep(delay)
+            if config.error_rate and draw() < config.error_rate:
+                stats.add("errores_inyectados")
+                self._send_json(config.error_status, {"error": True, "reason": "Error inyectado"})
+                return
+
+            try:
+                status, payload = self._respond(params)
+            except (KeyError, ValueError) as e:
+                status, payload = 400, {"error": True, "reason": f"Parámetros inválidos: {e}"}
+            self._send_json(status, payload)
+
+        def _respond(self, params):
+            if config.modo == "sintetico":
+                stats.add("ok")
+                return 200, synthetic_response(params, config.seed)
+
+            path = os.path.join(config.fixtures_dir, fixture_name(params))
+            if config.modo == "replay":
+                if not os.path.exists(path):
+                    stats.add("sin_fixture")
+                    return 404, {"error": True, "reason": f"Sin fixture {os.path.basename(path)}"}
+                with open(path, "rb") as f:
+                    stats.add("ok")
+                    return 200, f.read()
+
+            # record: se consulta el servicio real y se guardan sólo las respuestas exitosas
+            try:
+                upstream = requests.get(config.upstream_url, params=params, timeout=60)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                stats.add("errores_upstream")
+                return 502, {"error": True, "reason": f"{type(e).__name__}: {e}"}
+            if upstream.status_code != 200:
+                stats.add("errores_upstream")
+                return upstream.status_code, upstream.content
+            os.makedirs(config.fixtures_dir, exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(upstream.content)
+            stats.add("ok")
+            return 200, upstream.content
+
+    return Handler
+
+class OpenMeteoStub:
+    """
+    Servidor en un hilo propio; se usa como context manager:
+
+        with OpenMeteoStub(StubConfig(latency=0.1)) as stub:
+            api.ARCHIVE_URL = stub.url
+    """
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        if config is None:
+            config = StubConfig()
+        if config.modo not in MODOS:
+            raise ValueError(f"Modo desconocido: {config.modo}")
+        self.config = config
+        self.stats = StubStats()
+        handler = _make_handler(config, self.stats, _RateLimiter(config.rate_limit), random.Random(config.seed))
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}{ARCHIVE_PATH}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """
+        Atiende consultas en el hilo actual (hasta Ctrl+C).
+        """
+        try:
+            self._server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._server.server_close()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor local que reemplaza al archivo histórico de Open-Meteo")
+    parser.add_argument("--modo", choices=MODOS, default="sintetico")
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES, help="Directorio de respuestas grabadas")
+    parser.add_argument("--upstream", default=UPSTREAM_URL, help="URL real usada en modo record")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--latencia", type=float, default=0.0, help="Segundos por respuesta")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Segundos extra al azar (0 a jitter)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probabilidad de responder error (0-1)")
+    parser.add_argument("--error-status", type=int, default=503, help="Código HTTP de los errores inyectados")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Consultas por segundo (0 = sin límite)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    config = StubConfig(
+        modo=args.modo, fixtures_dir=args.fixtures, upstream_url=args.upstream, latency=args.latencia,
+        jitter=args.jitter, error_rate=args.error_rate, error_status=args.error_status,
+        rate_limit=args.rate_limit, seed=args.seed,
+    )
+    stub = OpenMeteoStub(config, args.host, args.port)
+    print(f"Open-Meteo local ({config.modo}) en {stub.url}")
+    print(f"Usar con: OPENMETEO_ARCHIVE_URL={stub.url}")
+    stub.serve_forever()
+    print(json.dumps(stub.stats.as_dict(), indent=2))
+
+if __name__ == "__main__":
+    main()
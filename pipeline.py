@@ -0,0 +1,276 @@
+"""
+Núcleo de cálculo del sistema de soiling, sin dependencias de Streamlit.
+
+Etapas: ingesta → clima → modelo → estadísticas diarias → recomendaciones.
+Cada etapa devuelve datos (DataFrames, diccionarios) en lugar de mostrar mensajes,
+de modo que puede usarse desde el dashboard, trabajos batch o scripts.
+"""
+import json
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from api import get_openmeteo_weather
+from soiling_methods import (apply_soiling_method, calculate_kimber_ratio, calculate_somosclean_ratio,
+                             daily_precipitation, generar_recomendaciones)
+from utils import build_daily_stats, get_days_below_threshold, get_unique_days_count
+
+# Horas de operación consideradas (6:00 a 20:00)
+HORA_INICIO = 6
+HORA_FIN = 20
+
+# Lluvia diaria (mm) que limpia los paneles según cada método (valores por defecto de los modelos)
+CLEANING_RAIN_MM = {"Kimber": 25.0, "SOMOSclean": 5.0}
+DEFAULT_CLEANING_RAIN_MM = 5.0
+
+# Ingesta por bloques
+SCADA_COLUMNS = ['DateTime', 'Soiling Ratio']
+CHUNK_ROWS = 500_000                  # Filas por bloque (lector de pandas)
+PYARROW_BLOCK_SIZE = 64 * 1024 * 1024  # Bytes por bloque (lector de pyarrow)
+
+@dataclass
+class PipelineResult:
+    """
+    Resultado completo de una corrida del pipeline.
+    """
+    df: pd.DataFrame
+    metodo: str
+    normalizacion: dict = None
+    kpis: dict = field(default_factory=dict)
+    recomendaciones: str = ""
+    tiempos: dict = field(default_factory=dict)
+
+def _clean_chunk(chunk):
+    """
+    Limpia un bloque del CSV: tipos compactos, descarta valores inválidos
+    y deja sólo las horas de operación.
+    """
+    date_time = pd.to_datetime(chunk['DateTime'], errors='coerce')
+    soiling = pd.to_numeric(chunk['Soiling Ratio'], errors='coerce').astype('float32')
+    hour = date_time.dt.hour
+    # Filtrar solo horas entre 6:00 y 20:00 (8 pm)
+    mask = soiling.notna() & (hour >= HORA_INICIO) & (hour <= HORA_FIN)
+    return pd.DataFrame({'DateTime': date_time[mask], 'Soiling Ratio': soiling[mask]})
+
+def iter_scada_chunks(source, chunksize=CHUNK_ROWS, engine="c"):
+    """
+    Lee el CSV por bloques, sólo con las columnas DateTime y Soiling Ratio.
+    engine="pyarrow" usa el lector en streaming de pyarrow si está instalado.
+    """
+    if engine == "pyarrow":
+        try:
+            import pyarrow as pa
+            import pyarrow.csv as pacsv
+        except ImportError:
+            engine = "c"
+
+    if engine == "pyarrow":
+        reader = pacsv.open_csv(
+            source,
+            read_options=pacsv.ReadOptions(block_size=PYARROW_BLOCK_SIZE),
+            convert_options=pacsv.ConvertOptions(
+                include_columns=SCADA_COLUMNS,
+                column_types={column: pa.string() for column in SCADA_COLUMNS},
+            ),
+        )
+        for batch in reader:
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(source, usecols=SCADA_COLUMNS, dtype=str, chunksize=chunksize)
+
+def load_scada_csv(source, chunksize=CHUNK_ROWS, engine="c"):
+    """
+    Etapa de ingesta: lee el CSV (ruta o archivo) con columnas DateTime y Soiling Ratio,
+    descarta valores no numéricos y deja sólo las horas de operación.
+    La lectura es por bloques, así que la memoria máxima no depende del tamaño del archivo
+    sino del bloque y de las filas que quedan después del filtro.
+    """
+    chunks = [_clean_chunk(chunk) for chunk in iter_scada_chunks(source, chunksize, engine)]
+    if chunks:
+        df = pd.concat(chunks, ignore_index=True)
+    else:
+        df = pd.DataFrame({'DateTime': pd.Series(dtype='datetime64[ns]'),
+                           'Soiling Ratio': pd.Series(dtype='float32')})
+    if not df['DateTime'].is_monotonic_increasing:
+        df = df.sort_values('DateTime', ignore_index=True)
+    return df
+
+def attach_weather(df, lat, lon):
+    """
+    Etapa de clima: agrega Clima, precipitation y cloudcover a cada registro.
+    Devuelve un frame nuevo que comparte las columnas de df (df no se modifica).
+    """
+    clima = get_openmeteo_weather(df['DateTime'], lat, lon)
+    df = df.copy(deep=False)
+    for column in clima.columns:
+        df[column] = clima[column]
+    return df
+
+def run_model(df, metodo):
+    """
+    Etapa de modelo: aplica el método de soiling.
+    Devuelve (df, normalizacion) con los metadatos de normalización de "Sin modelo".
+    """
+    return apply_soiling_method(df, metodo)
+
+# Métodos con estado reanudable: función y columna de salida
+_INCREMENTAL_MODELS = {
+    "Kimber": (calculate_kimber_ratio, 'Soiling Ratio Kimber'),
+    "SOMOSclean": (calculate_somosclean_ratio, 'Soiling Ratio SOMOSclean'),
+}
+
+def run_model_incremental(df, metodo, state=None):
+    """
+    Etapa de modelo reanudable: con el estado de la corrida anterior sólo se calculan
+    los datos nuevos (posteriores a state['last_time']).
+    Devuelve (df, estado) con el estado en el último registro, serializable a JSON.
+    df no se modifica.
+    Los cortes deben caer en el cambio de día: con Kimber, si df termina a mitad de un día,
+    las filas ya entregadas de ese día pueden cambiar al completarlo (la lluvia del día se
+    suma entera); la continuación sí es exacta. SOMOSclean es exacto con cualquier corte.
+    """
+    if metodo not in _INCREMENTAL_MODELS:
+        raise ValueError(f"El método {metodo} no admite cálculo incremental")
+    model_fn, column = _INCREMENTAL_MODELS[metodo]
+
+    df = df.copy(deep=False)
+    if 'Soiling Ratio Original' not in df.columns:
+        df['Soiling Ratio Original'] = df['Soiling Ratio']
+    df, state = model_fn(df, state=state, return_state=True)
+    df['Soiling Ratio'] = df.pop(column)
+    return df, state
+
+def save_model_state(state, path):
+    """
+    Guarda el estado del modelo en un archivo JSON.
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+
+def load_model_state(path):
+    """
+    Lee un estado guardado con save_model_state.
+    """
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def filter_date_range(df, start_date=None, end_date=None):
+    """
+    Restringe el DataFrame al rango de fechas [start_date, end_date] (días completos, ambos incluidos).
+    df viene ordenado por DateTime, así que el rango se ubica con búsqueda binaria y el
+    resultado es un corte de filas contiguas que comparte los datos de df (sólo lectura).
+    """
+    if start_date is None and end_date is None:
+        return df
+    if not df['DateTime'].is_monotonic_increasing:
+        df = df.sort_values('DateTime', ignore_index=True)
+    date_time = df['DateTime']
+    lo = date_time.searchsorted(pd.Timestamp(start_date), side='left') if start_date is not None else 0
+    hi = (date_time.searchsorted(pd.Timestamp(end_date) + pd.Timedelta(days=1), side='left')
+          if end_date is not None else len(df))
+    return df.iloc[lo:hi]
+
+def soiling_status(sr_avg, threshold):
+    """
+    Estado del sistema según el promedio del Soiling Ratio: (etiqueta, color).
+    """
+    if sr_avg >= threshold:
+        return ("🟢 Normal", "green")
+    elif sr_avg >= threshold - 0.03:
+        return ("🟡 Advertencia", "orange")
+    return ("🔴 Limpieza necesaria", "red")
+
+def daily_summary(df):
+    """
+    Etapa de estadísticas diarias: resumen por día del rango filtrado.
+    Se calcula una vez y lo comparten los KPIs y las recomendaciones.
+    """
+    return build_daily_stats(df)
+
+def compute_kpis(df, threshold, daily_stats=None):
+    """
+    KPIs del período (usa el resumen diario si ya está calculado).
+    """
+    if daily_stats is None:
+        daily_stats = build_daily_stats(df)
+    sr_avg = float(df['Soiling Ratio'].mean())
+    return {
+        "sr_avg": sr_avg,
+        "sr_loss": (1 - sr_avg) * 100,
+        "days_below": get_days_below_threshold(df, 'Soiling Ratio', threshold, daily_stats),
+        "total_days": get_unique_days_count(df, daily_stats),
+        "status": soiling_status(sr_avg, threshold),
+    }
+
+def last_cleaning_event(df, metodo):
+    """
+    Último día con lluvia suficiente para limpiar los paneles según el método, o None.
+    """
+    if df.empty or 'precipitation' not in df.columns:
+        return None
+    threshold = CLEANING_RAIN_MM.get(metodo, DEFAULT_CLEANING_RAIN_MM)
+    rain = daily_precipitation(df['DateTime'], df['precipitation'])
+    cleaned = np.flatnonzero(rain >= threshold)
+    return df['DateTime'].iloc[cleaned[-1]].normalize() if len(cleaned) else None
+
+def project_summary(df, metodo, threshold, daily_stats=None):
+    """
+    Indicadores de un proyecto para la vista de flota: KPIs del período, SR del último día
+    con datos y última limpieza por lluvia.
+    """
+    if daily_stats is None:
+        daily_stats = build_daily_stats(df)
+    kpis = compute_kpis(df, threshold, daily_stats)
+    if daily_stats.empty:
+        kpis["status"] = ("⚪ Sin datos", "gray")
+    return {
+        **kpis,
+        "sr_actual": float(daily_stats['Soiling Ratio'].iloc[-1]) if len(daily_stats) else None,
+        "ultimo_dato": daily_stats['Date'].iloc[-1] if len(daily_stats) else None,
+        "ultima_limpieza": last_cleaning_event(df, metodo),
+    }
+
+def build_recommendations(df, metodo, threshold, daily_stats=None):
+    """
+    Etapa de recomendaciones: texto en Markdown con las recomendaciones de limpieza.
+    """
+    return generar_recomendaciones(df, metodo, threshold, daily_stats)
+
+def run_pipeline(source, lat, lon, metodo, threshold=0.9, start_date=None, end_date=None):
+    """
+    Ejecuta todas las etapas para un archivo y una ubicación.
+    """
+    tiempos = {}
+
+    t0 = time.perf_counter()
+    df = load_scada_csv(source)
+    tiempos["ingesta"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    df = attach_weather(df, lat, lon)
+    tiempos["clima"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    df, normalizacion = run_model(df, metodo)
+    tiempos["modelo"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    filtered_df = filter_date_range(df, start_date, end_date)
+    daily_stats = daily_summary(filtered_df)
+    kpis = compute_kpis(filtered_df, threshold, daily_stats)
+    tiempos["estadisticas"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    recomendaciones = build_recommendations(filtered_df, metodo, threshold, daily_stats) if not filtered_df.empty else ""
+    tiempos["recomendaciones"] = time.perf_counter() - t0
+
+    return PipelineResult(
+        df=filtered_df,
+        metodo=metodo,
+        normalizacion=normalizacion,
+        kpis=kpis,
+        recomendaciones=recomendaciones,
+        tiempos=tiempos,
+    )
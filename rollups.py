@@ -0,0 +1,130 @@
+"""
+Pirámide de agregados por período (hora, día, semana y mes) del Soiling Ratio.
+
+Se construye una vez por dataset con sumas y conteos por nivel (operaciones de arreglo,
+sin funciones por fila). Cambiar el período o el rango de fechas sólo recorta estas
+tablas: los niveles hora y día se cortan con búsqueda binaria y las semanas o meses
+que quedan cortados por el rango se recalculan a partir de los días del rango.
+"""
+import numpy as np
+import pandas as pd
+
+ROLLUP_COLUMNS = ['Soiling Ratio', 'Soiling Ratio Original']
+HISTORICO = "Todo el histórico"
+
+def _aggregate(keys, sums, counts, n):
+    """
+    Suma por grupo de sumas y conteos ordenados por clave (cada cambio de clave abre un grupo).
+    """
+    new_group = np.r_[True, keys[1:] != keys[:-1]] if len(keys) else np.empty(0, dtype=bool)
+    codes = np.cumsum(new_group) - 1
+    first = np.flatnonzero(new_group)
+    size = len(first)
+    table = {'Periodo': keys[first], 'n': np.bincount(codes, weights=n, minlength=size).astype(np.int64)}
+    for column in sums:
+        table[f'{column}__sum'] = np.bincount(codes, weights=sums[column], minlength=size)
+        table[f'{column}__count'] = np.bincount(codes, weights=counts[column], minlength=size)
+    return pd.DataFrame(table)
+
+def _week_start(days):
+    # Semana de lunes a domingo (igual que to_period('W').start_time); el 1970-01-01 fue jueves
+    days = days.astype('datetime64[D]')
+    return (days - (days.view('int64') + 3) % 7).astype('datetime64[ns]')
+
+def _month_start(days):
+    return days.astype('datetime64[M]').astype('datetime64[ns]')
+
+# Inicio del período de cada día y fin (exclusivo) de cada período
+_COARSE_KEYS = {"Semana": _week_start, "Mes": _month_start}
+_COARSE_ENDS = {
+    "Semana": lambda starts: starts + np.timedelta64(7, 'D'),
+    "Mes": lambda starts: (starts.astype('datetime64[M]') + 1).astype('datetime64[ns]'),
+}
+
+def _regroup(table, level):
+    """
+    Agrega una tabla de un nivel más fino al nivel `level` (Semana o Mes).
+    """
+    columns = [c[:-len('__sum')] for c in table.columns if c.endswith('__sum')]
+    keys = _COARSE_KEYS[level](table['Periodo'].to_numpy(dtype='datetime64[ns]'))
+    return _aggregate(
+        keys,
+        {c: table[f'{c}__sum'].to_numpy() for c in columns},
+        {c: table[f'{c}__count'].to_numpy() for c in columns},
+        table['n'].to_numpy(),
+    )
+
+def build_rollups(df, columns=ROLLUP_COLUMNS):
+    """
+    Sumas y conteos del Soiling Ratio (modelo y original) por hora, día, semana y mes.
+    df debe estar ordenado por DateTime. Devuelve un dict nivel -> DataFrame.
+    """
+    columns = [c for c in columns if c in df.columns]
+    times = df['DateTime'].to_numpy(dtype='datetime64[ns]')
+    sums, counts = {}, {}
+    for column in columns:
+        values = df[column].to_numpy(dtype=float)
+        valid = ~np.isnan(values)
+        sums[column] = np.where(valid, values, 0.0)
+        counts[column] = valid.astype(float)
+
+    hourly = _aggregate(times.astype('datetime64[h]').astype('datetime64[ns]'), sums, counts, np.ones(len(times)))
+    daily = _aggregate(
+        hourly['Periodo'].to_numpy().astype('datetime64[D]').astype('datetime64[ns]'),
+        {c: hourly[f'{c}__sum'].to_numpy() for c in columns},
+        {c: hourly[f'{c}__count'].to_numpy() for c in columns},
+        hourly['n'].to_numpy(),
+    )
+    return {"Hora": hourly, "Día": daily, "Semana": _regroup(daily, "Semana"), "Mes": _regroup(daily, "Mes")}
+
+def _means(table):
+    """
+    Promedios por período a partir de sumas y conteos (NaN si el período no tiene datos).
+    """
+    result = table[['Periodo']].copy()
+    for column in [c[:-len('__sum')] for c in table.columns if c.endswith('__sum')]:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result[column] = table[f'{column}__sum'].to_numpy() / table[f'{column}__count'].to_numpy()
+    result['n'] = table['n'].to_numpy()
+    return result.reset_index(drop=True)
+
+def _slice(table, start, end):
+    periodo = table['Periodo']
+    lo = periodo.searchsorted(start, side='left') if start is not None else 0
+    hi = periodo.searchsorted(end, side='left') if end is not None else len(table)
+    return table.iloc[lo:hi]
+
+def rollup_slice(rollups, level, start_date=None, end_date=None):
+    """
+    Promedio y cantidad de registros por período (level: Hora, Día, Semana, Mes o
+    "Todo el histórico") dentro de [start_date, end_date] (días completos, ambos incluidos).
+    """
+    start = pd.Timestamp(start_date) if start_date is not None else None
+    end = pd.Timestamp(end_date) + pd.Timedelta(days=1) if end_date is not None else None
+
+    if level in ("Hora", "Día"):
+        return _means(_slice(rollups[level], start, end))
+
+    daily = _slice(rollups["Día"], start, end)
+    if level == HISTORICO:
+        total = pd.DataFrame({c: [daily[c].sum()] for c in daily.columns if c != 'Periodo'})
+        total.insert(0, 'Periodo', 'Histórico')
+        return _means(total)
+
+    # Períodos completos dentro del rango: tal como se precalcularon
+    table = rollups[level]
+    if start is None and end is None:
+        return _means(table)
+    starts = table['Periodo'].to_numpy(dtype='datetime64[ns]')
+    ends = _COARSE_ENDS[level](starts)
+    inside = np.ones(len(table), dtype=bool)
+    if start is not None:
+        inside &= starts >= start.to_datetime64()
+    if end is not None:
+        inside &= ends <= end.to_datetime64()
+    complete = table[inside]
+
+    # Períodos cortados por el rango: se recalculan con los días del rango
+    day_keys = _COARSE_KEYS[level](daily['Periodo'].to_numpy(dtype='datetime64[ns]'))
+    partial = _regroup(daily[~np.isin(day_keys, complete['Periodo'].to_numpy(dtype='datetime64[ns]'))], level)
+    return _means(pd.concat([complete, partial]).sort_values('Periodo'))
@@ -1,8 +1,144 @@
 import pandas as pd
 import numpy as np
 
+from utils import build_daily_stats, daily_precipitation
+
+# Tiempo por fila en el modo "fila" (sin mirar DateTime, como el cálculo anterior):
+# Kimber avanza una hora por fila y SOMOSclean un día por fila
+ROW_STEP_DAYS = {"Kimber": 1 / 24, "SOMOSclean": 1.0}
+
+# Tope de eqD (días equivalentes): con cualquier k razonable SOMOSclean ya está saturado y,
+# junto con el tope de los factores, ningún producto del scan puede desbordar a inf
+MAX_EQD = 1e6
+_MAX_FACTOR = 1e150
+
+# Frecuencia de limpieza (rango en días) de las recomendaciones según la fracción de días
+# con SR < 0.96: (más del 30 %, algún día, ningún día)
+FRECUENCIA_LIMPIEZA = {
+    "SOMOSclean": ((10, 12), (18, 22), (18, 22)),
+    "Kimber": ((7, 10), (15, 20), (25, 30)),
+    "Sin modelo": ((10, 15), (20, 25), (30, 30)),
+}
+UMBRAL_CRITICO = 0.96
+
+def elapsed_days(date_times, time_basis="transcurrido", last_time=None, row_step=1 / 24):
+    """
+    Días transcurridos desde el origen hasta cada registro (date_times ordenado).
+    - "transcurrido": tiempo real según DateTime; el origen es last_time (estado anterior)
+      o el primer registro, así que el resultado no depende de la frecuencia de muestreo.
+    - "fila": cada fila avanza row_step días (supone datos regulares).
+    """
+    n = len(date_times)
+    if time_basis == "fila":
+        return np.arange(1, n + 1) * row_step
+    if time_basis != "transcurrido":
+        raise ValueError(f"Base de tiempo desconocida: {time_basis}")
+    if n == 0:
+        return np.empty(0, dtype=float)
+    origin = pd.Timestamp(last_time) if last_time is not None else date_times.iloc[0]
+    return ((date_times - origin) / pd.Timedelta(days=1)).to_numpy(dtype=float)
+
+def _kimber_reference_times(rain_event, elapsed, forward, initial_event):
+    """
+    Momento desde el que corre el período de gracia de cada registro y si hubo evento antes.
+    Con forward=True el estado de cada registro rige hasta el siguiente: un evento limpia
+    el intervalo que le sigue y la gracia empieza en el registro siguiente al último evento
+    (con datos cada 5 minutos o cada hora la gracia empieza en el mismo momento).
+    """
+    n = len(rain_event)
+    idx = np.arange(n)
+    last_event = np.maximum.accumulate(np.where(rain_event, idx, -1))
+    after_event = last_event >= 0
+    reference = elapsed[np.minimum(np.maximum(last_event, 0) + int(forward), n - 1)]
+    initial_reference = elapsed[0] if forward and initial_event else 0.0
+    return np.where(after_event, reference, initial_reference), after_event
+
+def _kimber_loss_numpy(rain_event, elapsed, soiling_rate, grace_period_days, max_soiling,
+                       initial_loss=0.0, initial_grace=0.0, initial_event=False, forward=True):
+    """
+    Motor vectorizado de Kimber.
+    Cada evento de lluvia fuerte reinicia la pérdida; después la pérdida sólo depende del
+    tiempo transcurrido desde el evento menos el período de gracia:
+    pérdida = min(tasa * max(0, t - t_referencia - gracia), máximo).
+    Antes del primer evento se parte del estado inicial (initial_loss, initial_grace, initial_event).
+    """
+    n = len(rain_event)
+    if n == 0:
+        return np.empty(0, dtype=float)
+
+    reference, after_event = _kimber_reference_times(rain_event, elapsed, forward, initial_event)
+    grace = np.where(after_event, grace_period_days, initial_grace)
+    # Tiempo de acumulación (días) desde el último reinicio o desde el estado inicial
+    active = np.maximum(elapsed - reference - grace, 0.0)
+
+    start = np.where(after_event, 0.0, initial_loss)
+    loss = np.minimum(start + soiling_rate * active, max_soiling)
+    return np.where(rain_event, 0.0, loss)
+
+def _kimber_loss_reference(rain_event, elapsed, soiling_rate, grace_period_days, max_soiling,
+                           initial_loss=0.0, initial_grace=0.0, initial_event=False, forward=True):
+    """
+    Implementación de referencia fila a fila (usada para validar el motor vectorizado).
+    """
+    soiling_loss = []
+    cumulative_loss = initial_loss
+    grace_counter = initial_grace  # Días de gracia restantes después de lluvia
+    previous_event = initial_event
+    previous = 0.0
+
+    for is_event, t in zip(rain_event, elapsed):
+        dt = t - previous  # Días desde el registro anterior
+        previous = t
+        # Si hay lluvia que supera el umbral, limpieza total
+        if is_event:
+            cumulative_loss = 0.0
+            grace_counter = grace_period_days  # Activar período de gracia
+        elif not (forward and previous_event):
+            # Período de gracia: tierra húmeda, sin ensuciamiento
+            grace_used = min(grace_counter, dt)
+            grace_counter -= grace_used
+            # Acumulación normal a tasa constante por el resto del intervalo, limitada al máximo
+            if dt > grace_used:
+                cumulative_loss = min(cumulative_loss + soiling_rate * (dt - grace_used), max_soiling)
+        previous_event = is_event
+
+        soiling_loss.append(cumulative_loss)
+    return np.asarray(soiling_loss, dtype=float)
+
+def _kimber_final_grace(rain_event, elapsed, grace_period_days, initial_grace, initial_event, forward):
+    """
+    Días de gracia restantes en el último registro.
+    """
+    if rain_event[-1]:
+        return float(grace_period_days)
+    reference, after_event = _kimber_reference_times(rain_event, elapsed, forward, initial_event)
+    grace = grace_period_days if after_event[-1] else initial_grace
+    return max(0.0, grace - (elapsed[-1] - reference[-1]))
+
+def _sorted_by_time(df):
+    """
+    Frame ordenado por DateTime. Si ya lo está (caso normal tras la ingesta) no se
+    reordena ni se copian los datos: se devuelve una copia superficial que comparte
+    las columnas, a la que se le pueden agregar columnas sin tocar el original.
+    """
+    if df['DateTime'].is_monotonic_increasing:
+        return df.copy(deep=False)
+    return df.sort_values('DateTime')
+
+def _check_state(state, metodo, params, date_times):
+    """
+    Valida que el estado corresponda al método y parámetros, y que los datos nuevos sean posteriores.
+    """
+    if state['metodo'] != metodo:
+        raise ValueError(f"El estado guardado es de {state['metodo']}, no de {metodo}")
+    if state['params'] != params:
+        raise ValueError("El estado guardado se calculó con otros parámetros")
+    if len(date_times) and date_times.min() <= pd.Timestamp(state['last_time']):
+        raise ValueError(f"Los datos nuevos deben ser posteriores a {state['last_time']}")
+
 def calculate_kimber_ratio(df, cleaning_threshold=25.0, soiling_rate=0.0015, 
-                          grace_period_days=15, max_soiling=0.30):
+                          grace_period_days=15, max_soiling=0.30, engine="numpy",
+                          state=None, return_state=False, time_basis="transcurrido"):
     """
     Método Kimber (basado en pvlib)
     El ensuciamiento se acumula a tasa constante hasta ser limpiado manual o naturalmente.
@@ -12,49 +148,174 @@ def calculate_kimber_ratio(df, cleaning_threshold=25.0, soiling_rate=0.0015,
     - soiling_rate: Tasa de acumulación diaria (default 0.15%)
     - grace_period_days: Días sin ensuciamiento después de lluvia fuerte
     - max_soiling: Máximo nivel de ensuciamiento (default 30%)
+    - engine: "numpy" (vectorizado) o "referencia" (bucle fila a fila)
+    - state: estado guardado de una corrida anterior; df debe contener sólo datos posteriores
+    - return_state: si es True devuelve (df, estado) para continuar luego
+    - time_basis: "transcurrido" (tiempo real entre registros, independiente de la frecuencia
+      de muestreo; con datos horarios regulares reproduce el cálculo anterior) o "fila" (una
+      hora por fila sin mirar DateTime; el período de gracia termina una fila antes que en el
+      cálculo anterior, así que tras cada uno el Soiling Ratio queda soiling_rate/24 más bajo)
+
+    Los eventos de limpieza dependen de la lluvia de todo el día. El estado guarda la lluvia
+    ya registrada del último día, así que la continuación es exacta aunque el corte caiga a
+    mitad de un día; pero las filas de ese último día ya entregadas se calcularon sin la lluvia
+    posterior y pueden no coincidir con un cálculo completo. Para que ninguna fila cambie, el
+    estado debe guardarse al cierre de un día (con datos hasta las 23:59).
     """
-    df = df.copy()
-    df = df.sort_values('DateTime')
-    
-    # Verificar si existe la columna de precipitación
-    if 'precipitation' not in df.columns:
-        df['precipitation'] = 0
-    
-    soiling_loss = []
-    cumulative_loss = 0.0
-    grace_counter = 0  # Contador de días de gracia después de lluvia
-    
-    # Agrupar por día para sumar precipitación diaria
-    df['date'] = df['DateTime'].dt.date
-    daily_precip = df.groupby('date')['precipitation'].sum().to_dict()
+    params = {'cleaning_threshold': cleaning_threshold, 'soiling_rate': soiling_rate,
+              'grace_period_days': grace_period_days, 'max_soiling': max_soiling,
+              'time_basis': time_basis}
+    df = _sorted_by_time(df)
     
-    for idx, row in df.iterrows():
-        fecha = row['date']
-        precip_daily = daily_precip.get(fecha, 0)
-        
-        # Si hay lluvia que supera el umbral, limpieza total
-        if precip_daily >= cleaning_threshold:
-            cumulative_loss = 0.0
-            grace_counter = grace_period_days  # Activar período de gracia
-        # Período de gracia: tierra húmeda, sin ensuciamiento
-        elif grace_counter > 0:
-            grace_counter -= 1/24  # Decrementar por hora
-            # No acumular ensuciamiento durante el período de gracia
-        else:
-            # Acumulación normal a tasa constante
-            cumulative_loss += soiling_rate / 24  # Por hora
-            
-            # Limitar al máximo de ensuciamiento
-            cumulative_loss = min(cumulative_loss, max_soiling)
-        
-        # Soiling Ratio = 1 - pérdida acumulada
-        soiling_loss.append(1 - cumulative_loss)
+    # Sin columna de precipitación se asume que no llovió
+    precipitation = df['precipitation'] if 'precipitation' in df.columns else np.zeros(len(df))
     
-    df['Soiling Ratio Kimber'] = soiling_loss
-    df = df.drop(columns=['date'])
-    return df
+    initial_loss, initial_grace, initial_event, last_time = 0.0, 0.0, False, None
+    if state is not None:
+        _check_state(state, "Kimber", params, df['DateTime'])
+        initial_loss, initial_grace = state['cumulative_loss'], state['grace_counter']
+        initial_event, last_time = state['rain_event'], state['last_time']
+
+    # Precipitación diaria asignada a cada fila
+    dates = df['DateTime'].dt.normalize()
+    precip_daily = daily_precipitation(df['DateTime'], precipitation, time_basis, last_time)
+    if state is not None:
+        # Si el día del estado continúa, se suma la lluvia ya registrada ese día
+        precip_daily = np.where(dates == pd.Timestamp(state['last_date']),
+                                precip_daily + state['precip_day'], precip_daily)
+    rain_event = precip_daily >= cleaning_threshold
+    elapsed = elapsed_days(df['DateTime'], time_basis, last_time, ROW_STEP_DAYS["Kimber"])
+
+    if engine == "numpy":
+        loss_fn = _kimber_loss_numpy
+    elif engine == "referencia":
+        loss_fn = _kimber_loss_reference
+    else:
+        raise ValueError(f"Motor de cálculo desconocido: {engine}")
+
+    # En tiempo real el estado de cada registro rige hasta el siguiente registro
+    forward = time_basis == "transcurrido"
+    cumulative_loss = loss_fn(rain_event, elapsed, soiling_rate, grace_period_days, max_soiling,
+                              initial_loss, initial_grace, initial_event, forward)
+
+    # Soiling Ratio = 1 - pérdida acumulada
+    df['Soiling Ratio Kimber'] = (1 - cumulative_loss).astype(np.float32)
+
+    if not return_state:
+        return df
+    if df.empty:
+        return df, state
+    new_state = {
+        'metodo': "Kimber",
+        'params': params,
+        'last_time': df['DateTime'].iloc[-1].isoformat(),
+        'last_date': dates.iloc[-1].date().isoformat(),
+        'precip_day': float(precip_daily[-1]),
+        'cumulative_loss': float(cumulative_loss[-1]),
+        'grace_counter': float(_kimber_final_grace(rain_event, elapsed, grace_period_days, initial_grace,
+                                                   initial_event, forward)),
+        'rain_event': bool(rain_event[-1]),
+    }
+    return df, new_state
+
+def _somosclean_factor(clima, precip, heavy_rain_threshold):
+    """
+    Factor f de SOMOSclean para cada fila, seleccionado de forma vectorizada.
+    clima puede ser categórico (se compara por código, sin convertir a strings).
+    """
+    precip = np.asarray(precip, dtype=float)
+
+    es_lluvia = np.asarray(clima == 'Lluvia')
+    # f decrece linealmente de 1 a 0 entre 1mm y heavy_rain_threshold
+    f_parcial = np.clip(1 - (precip / heavy_rain_threshold), 0, 1)
+
+    return np.select(
+        [
+            es_lluvia & (precip >= heavy_rain_threshold),  # Limpieza total (lluvia intensa)
+            es_lluvia & (precip >= 1.0),                   # Limpieza parcial proporcional a la lluvia
+            es_lluvia,                                     # Lluvia ligera, sin limpieza significativa
+            np.asarray(clima == 'Despejado'),              # Eventos de polvo: acumulación acelerada
+        ],
+        [0.0, f_parcial, 0.95, 1.1],
+        default=1.0,  # Día normal sin eventos especiales
+    )
+
+def _affine_scan(a, b, x0=0.0, upper=MAX_EQD):
+    """
+    Resuelve x(i) = min(a(i) * x(i-1) + b(i), upper) para todo i con operaciones de arreglo
+    (a, b >= 0). Con arreglos 2D cada fila es una serie independiente (scan sobre el último eje).
+
+    Usa un prefijo por duplicación (Hillis-Steele) sobre transformaciones x -> min(A*x + B, C):
+    cada pasada compone cada posición con la de 2^j filas atrás y el resultado sigue teniendo
+    esa forma. A se limita a _MAX_FACTOR y B a C, así ningún producto llega a inf (ni a NaN
+    por inf * 0); el resultado sólo cambiaría para x menores a upper / _MAX_FACTOR.
+    """
+    A = np.minimum(np.array(a, dtype=float), _MAX_FACTOR)
+    B = np.minimum(np.array(b, dtype=float), upper)
+    C = np.full(A.shape, float(upper))
+    n = A.shape[-1]
+
+    # Tras un reinicio no hace falta mirar más atrás: basta con cubrir el
+    # tramo más largo entre reinicios
+    idx = np.arange(n)
+    last_reset = np.maximum.accumulate(np.where(A == 0, idx, -1), axis=-1)
+    span = int((idx - last_reset).max()) + 1 if n else 0
+
+    step = 1
+    while step < min(n, span):
+        A_prev, B_prev, C_prev = A[..., :-step], B[..., :-step], C[..., :-step]
+        A_cur, B_cur = A[..., step:], B[..., step:]
+        # Composición: x -> min(A_cur * min(A_prev * x + B_prev, C_prev) + B_cur, C_cur)
+        C_new = np.minimum(A_cur * C_prev + B_cur, C[..., step:])
+        B_new = np.minimum(A_cur * B_prev + B_cur, C_new)
+        A_new = np.minimum(A_cur * A_prev, _MAX_FACTOR)
+        A[..., step:] = A_new
+        B[..., step:] = B_new
+        C[..., step:] = C_new
+        step *= 2
+    return np.minimum(A * min(x0, upper) + B, C)
+
+def _somosclean_coefficients(f, dt):
+    """
+    Coeficientes (a, b) de eqD(t) = a * eqD(t - dt) + b para un intervalo de dt días con factor f.
+    Con dt = 1 es la fórmula diaria eqD(d) = f * (eqD(d-1) + 1); para otros dt se aplica
+    la misma fórmula de forma continua: eqD tiende al punto fijo f / (1 - f) como f^dt,
+    de modo que encadenar intervalos cortos equivale a un día completo.
+    """
+    f = np.asarray(f, dtype=float)
+    dt = np.broadcast_to(np.asarray(dt, dtype=float), f.shape)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_f = np.log(f)
+        a = np.exp(dt * log_f)
+        # 1 - f^dt con expm1 para no perder precisión cuando f^dt es cercano a 1
+        b = np.where(f == 1.0, dt, f / (1 - f) * -np.expm1(dt * log_f))
+    # f = 0: limpieza total, eqD vuelve a cero aunque no haya pasado tiempo.
+    # Con f > 1 e intervalos muy largos a y b desbordan: se limitan a valores finitos
+    zero = f == 0
+    return np.where(zero, 0.0, np.minimum(a, _MAX_FACTOR)), np.where(zero, 0.0, np.minimum(b, MAX_EQD))
+
+def _somosclean_eqd_scan(a, b, initial_eqd=0.0):
+    """
+    Motor vectorizado: eqD es un scan afín sobre los coeficientes de cada intervalo.
+    """
+    return _affine_scan(a, b, initial_eqd)
 
-def calculate_somosclean_ratio(df, delta_SL_sat=0.25, k=15.0, heavy_rain_threshold=5.0):
+def _somosclean_eqd_reference(a, b, initial_eqd=0.0):
+    """
+    Implementación de referencia fila a fila (usada para validar el motor vectorizado).
+    """
+    eqD_values = np.empty(len(a), dtype=float)
+    eqD = initial_eqd  # Días equivalentes desde última limpieza
+    for i, (a_i, b_i) in enumerate(zip(a, b)):
+        # Actualizar eqD con la fórmula del intervalo (un día: eqD(d) = f * (eqD(d-1) + 1)),
+        # con el mismo tope que el motor vectorizado
+        eqD = min(a_i * eqD + b_i, MAX_EQD)
+        eqD_values[i] = eqD
+    return eqD_values
+
+def calculate_somosclean_ratio(df, delta_SL_sat=0.25, k=15.0, heavy_rain_threshold=5.0,
+                               engine="numpy", state=None, return_state=False,
+                               time_basis="transcurrido"):
     """
     Método SOMOSclean (ENEL)
     Modelo empírico basado en crecimiento exponencial complementario.
@@ -65,127 +326,147 @@ def calculate_somosclean_ratio(df, delta_SL_sat=0.25, k=15.0, heavy_rain_thresho
     - delta_SL_sat: Nivel de saturación máximo (20-30%, default 25%)
     - k: Constante de tiempo que representa la tasa de ensuciamiento (días)
     - heavy_rain_threshold: Umbral de precipitación para limpieza total (mm)
+    - engine: "numpy" (scan vectorizado) o "referencia" (bucle fila a fila)
+    - state: estado guardado de una corrida anterior; df debe contener sólo datos posteriores
+    - return_state: si es True devuelve (df, estado) para continuar luego
+    - time_basis: "transcurrido" (eqD avanza según el tiempo real entre registros, independiente
+      de la frecuencia de muestreo) o "fila" (un día equivalente por fila, comportamiento anterior)
     """
-    df = df.copy()
-    df = df.sort_values('DateTime')
-    
-    # Verificar si existe la columna de precipitación
-    if 'precipitation' not in df.columns:
-        df['precipitation'] = 0
+    params = {'delta_SL_sat': delta_SL_sat, 'k': k, 'heavy_rain_threshold': heavy_rain_threshold,
+              'time_basis': time_basis}
+    df = _sorted_by_time(df)
     
-    soiling_loss = []
-    eqD = 0.0  # Días equivalentes desde última limpieza
+    # Sin columna de precipitación se asume que no llovió
+    precipitation = df['precipitation'] if 'precipitation' in df.columns else np.zeros(len(df))
     
-    for idx, row in df.iterrows():
-        clima = row.get('Clima', 'Sin datos')
-        precip = row.get('precipitation', 0)  # precipitación en mm
-        
-        # Calcular factor f según eventos
-        if clima == 'Lluvia':
-            if precip >= heavy_rain_threshold:
-                # Limpieza total (lluvia intensa)
-                f = 0.0
-            elif precip >= 1.0:
-                # Limpieza parcial proporcional a la lluvia
-                # f decrece linealmente de 1 a 0 entre 1mm y heavy_rain_threshold
-                f = 1 - (precip / heavy_rain_threshold)
-                f = max(0, min(1, f))
-            else:
-                # Lluvia ligera, sin limpieza significativa
-                f = 0.95
-        elif clima == 'Despejado':
-            # Días despejados pueden aumentar ensuciamiento (eventos de polvo)
-            # Se asume f ligeramente > 1 para simular acumulación acelerada
-            f = 1.1
-        else:
-            # Día normal sin eventos especiales
-            f = 1.0
-        
-        # Actualizar eqD según la fórmula: eqD(d) = f * (eqD(d-1) + 1)
-        eqD = f * (eqD + 1)
-        
-        # Calcular pérdida por ensuciamiento según modelo exponencial
-        SL = delta_SL_sat * (1 - np.exp(-eqD / k))
-        
-        # Soiling Ratio = 1 - SL
-        soiling_loss.append(1 - SL)
+    initial_eqd, initial_factor, last_time = 0.0, 1.0, None
+    if state is not None:
+        _check_state(state, "SOMOSclean", params, df['DateTime'])
+        initial_eqd, initial_factor, last_time = state['eqD'], state['factor'], state['last_time']
+
+    clima = df['Clima'].array if 'Clima' in df.columns else np.full(len(df), 'Sin datos', dtype=object)
+    f = _somosclean_factor(clima, precipitation, heavy_rain_threshold)
+    # Días transcurridos en cada intervalo (desde el registro anterior)
+    dt = np.diff(elapsed_days(df['DateTime'], time_basis, last_time, ROW_STEP_DAYS["SOMOSclean"]), prepend=0.0)
+    # En tiempo real el clima de cada registro rige hasta el siguiente: el intervalo que
+    # termina en un registro usa el factor del registro anterior
+    f_interval = np.concatenate(([initial_factor], f))[:len(f)] if time_basis == "transcurrido" else f
+    a, b = _somosclean_coefficients(f_interval, dt)
+
+    if engine == "numpy":
+        eqD = _somosclean_eqd_scan(a, b, initial_eqd)
+    elif engine == "referencia":
+        eqD = _somosclean_eqd_reference(a, b, initial_eqd)
+    else:
+        raise ValueError(f"Motor de cálculo desconocido: {engine}")
+
+    # Calcular pérdida por ensuciamiento según modelo exponencial
+    SL = delta_SL_sat * (1 - np.exp(-eqD / k))
     
-    df['Soiling Ratio SOMOSclean'] = soiling_loss
-    return df
+    # Soiling Ratio = 1 - SL
+    df['Soiling Ratio SOMOSclean'] = (1 - SL).astype(np.float32)
+
+    if not return_state:
+        return df
+    if df.empty:
+        return df, state
+    new_state = {
+        'metodo': "SOMOSclean",
+        'params': params,
+        'last_time': df['DateTime'].iloc[-1].isoformat(),
+        'eqD': float(eqD[-1]),
+        'factor': float(f[-1]),
+    }
+    return df, new_state
+
+def normalize_soiling_ratio(values):
+    """
+    Normaliza datos "Sin modelo" a escala 0-1.
+    Devuelve (valores normalizados, metadatos de la normalización) sin mostrar nada en pantalla;
+    los metadatos incluyen el caso aplicado, el nivel ("info"/"warning") y el mensaje para el usuario.
+    """
+    # Detectar rango de datos
+    sr_min = values.min()
+    sr_max = values.max()
+    info = {"sr_min": float(sr_min), "sr_max": float(sr_max)}
+
+    # Caso 1: Datos en escala 0-100 o 0-1000
+    if sr_max > 10:
+        values = values / 100.0
+        info.update(caso="escala_100", nivel="info",
+                    mensaje=f"✓ Datos normalizados de escala 0-{int(sr_max)} a escala 0-1 (dividido por 100)")
+
+    # Caso 2: Datos ya en escala 0-1 pero con valores muy altos (ej: 0.999)
+    elif sr_min > 0.5 and sr_max > 0.95:
+        # Ya están en rango correcto, no hacer nada
+        info.update(caso="sin_cambios", nivel="info",
+                    mensaje="✓ Datos ya en escala 0-1 (sin normalización)")
+
+    # Caso 3: Datos en otro rango - normalizar min-max a 0-1
+    elif sr_max > sr_min:
+        # Normalización min-max: (x - min) / (max - min)
+        values = (values - sr_min) / (sr_max - sr_min)
+        info.update(caso="min_max", nivel="info",
+                    mensaje=f"✓ Datos normalizados de rango [{sr_min:.2f}, {sr_max:.2f}] a escala 0-1")
+    else:
+        info.update(caso="constante", nivel="warning",
+                    mensaje="⚠️ Todos los valores son iguales, no se puede normalizar")
+
+    return values, info
 
 def apply_soiling_method(df, metodo):
     """
     Aplica el método de soiling seleccionado.
     PRESERVA la columna original para comparación.
     Normaliza datos "Sin modelo" a escala 0-1.
+    Devuelve (df, normalizacion); normalizacion es None salvo en "Sin modelo".
+    No modifica df: el resultado comparte con él las columnas que no cambian.
     """
-    # Guardar columna original si no existe ya
+    normalizacion = None
+    df = df.copy(deep=False)
+
+    # Guardar columna original si no existe ya ('Soiling Ratio' se reemplaza, no se modifica)
     if 'Soiling Ratio Original' not in df.columns:
-        df['Soiling Ratio Original'] = df['Soiling Ratio'].copy()
+        df['Soiling Ratio Original'] = df['Soiling Ratio']
     
     if metodo == "SOMOSclean":
         df = calculate_somosclean_ratio(df)
-        df['Soiling Ratio'] = df['Soiling Ratio SOMOSclean']
-        df.drop(columns=['Soiling Ratio SOMOSclean'], inplace=True)
+        df['Soiling Ratio'] = df.pop('Soiling Ratio SOMOSclean')
         
     elif metodo == "Kimber":
         df = calculate_kimber_ratio(df)
-        df['Soiling Ratio'] = df['Soiling Ratio Kimber']
-        df.drop(columns=['Soiling Ratio Kimber'], inplace=True)
+        df['Soiling Ratio'] = df.pop('Soiling Ratio Kimber')
         
     elif metodo == "Sin modelo":
-        import streamlit as st
-        
-        # Restaurar valores originales
-        df['Soiling Ratio'] = df['Soiling Ratio Original'].copy()
-        
-        # Detectar rango de datos
-        sr_min = df['Soiling Ratio'].min()
-        sr_max = df['Soiling Ratio'].max()
-        
-        # Caso 1: Datos en escala 0-100 o 0-1000
-        if sr_max > 10:
-            df['Soiling Ratio'] = df['Soiling Ratio'] / 100.0
-            st.info(f"✓ Datos normalizados de escala 0-{int(sr_max)} a escala 0-1 (dividido por 100)")
-        
-        # Caso 2: Datos ya en escala 0-1 pero con valores muy altos (ej: 0.999)
-        elif sr_min > 0.5 and sr_max > 0.95:
-            # Ya están en rango correcto, no hacer nada
-            st.info("✓ Datos ya en escala 0-1 (sin normalización)")
-        
-        # Caso 3: Datos en otro rango - normalizar min-max a 0-1
-        else:
-            # Normalización min-max: (x - min) / (max - min)
-            if sr_max > sr_min:
-                df['Soiling Ratio'] = (df['Soiling Ratio'] - sr_min) / (sr_max - sr_min)
-                st.info(f"✓ Datos normalizados de rango [{sr_min:.2f}, {sr_max:.2f}] a escala 0-1")
-            else:
-                st.warning("⚠️ Todos los valores son iguales, no se puede normalizar")
+        # Restaurar valores originales y llevarlos a escala 0-1
+        df['Soiling Ratio'], normalizacion = normalize_soiling_ratio(df['Soiling Ratio Original'])
     
-    return df
+    return df, normalizacion
 
-def generar_recomendaciones(df, metodo, threshold):
+def frecuencia_limpieza(daily_stats, metodo):
+    """
+    Rango de días entre limpiezas (min, max) que recomienda generar_recomendaciones.
+    """
+    dias_bajo_umbral = int((daily_stats['Soiling Ratio'] < UMBRAL_CRITICO).sum())
+    alta, alguna, ninguna = FRECUENCIA_LIMPIEZA.get(metodo, FRECUENCIA_LIMPIEZA["Sin modelo"])
+    if dias_bajo_umbral > len(daily_stats) * 0.3:
+        return alta
+    return alguna if dias_bajo_umbral > 0 else ninguna
+
+def _rango_dias(rango):
+    return f"{rango[0]}" if rango[0] == rango[1] else f"{rango[0]}-{rango[1]}"
+
+def generar_recomendaciones(df, metodo, threshold, daily_stats=None):
     """
     Genera recomendaciones de limpieza basadas en DÍAS ÚNICOS (no registros).
     Umbral crítico: SR < 0.96 (pérdida > 4%)
+    daily_stats: resumen diario ya calculado (utils.build_daily_stats); si falta se construye.
     """
     recomendaciones = []
     
-    # ========== VERIFICAR COLUMNAS DISPONIBLES ==========
-    if 'precipitation' not in df.columns:
-        df['precipitation'] = 0
-    if 'Clima' not in df.columns:
-        df['Clima'] = 'Sin datos'
-    # ====================================================
-    
     # ========== AGRUPAR POR DÍAS ÚNICOS ==========
-    df_daily = df.copy()
-    df_daily['Date'] = df_daily['DateTime'].dt.date
-    daily_stats = df_daily.groupby('Date').agg({
-        'Soiling Ratio': 'mean',
-        'Clima': lambda x: x.mode()[0] if len(x.mode()) > 0 else 'Sin datos',
-        'precipitation': 'sum'
-    }).reset_index()
+    if daily_stats is None:
+        daily_stats = build_daily_stats(df)
     # =============================================
     
     # Calcular métricas basadas en DÍAS
@@ -195,9 +476,9 @@ def generar_recomendaciones(df, metodo, threshold):
     perdida_max = (1 - sr_min) * 100  # Pérdida máxima en %
     
     # Umbral crítico: 4% de pérdida = SR < 0.96
-    umbral_critico = 0.96
-    dias_bajo_umbral = len(daily_stats[daily_stats['Soiling Ratio'] < umbral_critico])
+    dias_bajo_umbral = len(daily_stats[daily_stats['Soiling Ratio'] < UMBRAL_CRITICO])
     total_dias = len(daily_stats)
+    frecuencia = _rango_dias(frecuencia_limpieza(daily_stats, metodo))
     
     # Recomendación por método
     if metodo == "SOMOSclean":
@@ -223,10 +504,7 @@ def generar_recomendaciones(df, metodo, threshold):
             recomendaciones.append(f"☀️ Sin eventos de limpieza natural - Limpieza manual urgente")
         
         # Frecuencia basada en constante de tiempo k (15 días típico)
-        if dias_bajo_umbral > total_dias * 0.3:
-            recomendaciones.append(f"📅 Frecuencia óptima: Limpieza cada 10-12 días")
-        else:
-            recomendaciones.append(f"📅 Frecuencia óptima: Limpieza cada 18-22 días")
+        recomendaciones.append(f"📅 Frecuencia óptima: Limpieza cada {frecuencia} días")
             
     elif metodo == "Kimber":
         if sr_avg < 0.96:  # Pérdida > 4%
@@ -248,12 +526,8 @@ def generar_recomendaciones(df, metodo, threshold):
             recomendaciones.append(f"☀️ Sin lluvias suficientes para limpieza natural (requiere ≥25mm)")
         
         # Frecuencia recomendada
-        if dias_bajo_umbral > total_dias * 0.3:
-            recomendaciones.append(f"📅 Frecuencia recomendada: Limpieza cada 7-10 días (alta acumulación)")
-        elif dias_bajo_umbral > 0:
-            recomendaciones.append(f"📅 Frecuencia recomendada: Limpieza cada 15-20 días")
-        else:
-            recomendaciones.append(f"📅 Frecuencia recomendada: Limpieza cada 25-30 días")
+        alta_acumulacion = " (alta acumulación)" if dias_bajo_umbral > total_dias * 0.3 else ""
+        recomendaciones.append(f"📅 Frecuencia recomendada: Limpieza cada {frecuencia} días{alta_acumulacion}")
     
     elif metodo == "Sin modelo":
         if sr_avg < 0.96:  # Pérdida > 4%
@@ -274,12 +548,7 @@ def generar_recomendaciones(df, metodo, threshold):
             recomendaciones.append(f"☀️ Período mayormente seco ({dias_despejado} días) - Mayor acumulación esperada")
         
         # Frecuencia básica
-        if dias_bajo_umbral > total_dias * 0.3:
-            recomendaciones.append(f"📅 Frecuencia sugerida: Limpieza cada 10-15 días")
-        elif dias_bajo_umbral > 0:
-            recomendaciones.append(f"📅 Frecuencia sugerida: Limpieza cada 20-25 días")
-        else:
-            recomendaciones.append(f"📅 Frecuencia sugerida: Limpieza cada 30 días")
+        recomendaciones.append(f"📅 Frecuencia sugerida: Limpieza cada {frecuencia} días")
     
     # Estadísticas adicionales (DÍAS)
     recomendaciones.append(f"\n**📊 Estadísticas del período:**")
@@ -2,15 +2,18 @@ import streamlit as st
 import pandas as pd
 import os
 from datetime import datetime
-from data_manager import load_ubicaciones, save_ubicaciones, add_proyecto, update_proyecto, delete_proyecto
-from utils import get_consecutive_days_below, get_weather_icon, get_unique_days_count, get_days_below_threshold
-from ui_components import show_kpis, show_chart
-from api import get_openmeteo_events
+from data_manager import load_ubicaciones, get_proyecto, add_proyecto, update_proyecto, delete_proyecto
+from utils import get_weather_icon
+from ui_components import show_kpis, show_chart, show_fleet_overview, scatter_class
+from fleet_summary import load_fleet_summary, summary_methods
+from downsampling import downsample
+from rollups import build_rollups, rollup_slice
 import plotly.graph_objects as go
 import base64
-import os
-from api import get_openmeteo_events
-from soiling_methods import apply_soiling_method, generar_recomendaciones
+import hashlib
+from dataset_store import list_projects, project_version, read_project, write_project
+from pipeline import (load_scada_csv, attach_weather, run_model, filter_date_range, daily_summary, compute_kpis,
+                      build_recommendations)
 
 st.set_page_config(
     page_title='Soiling System Dashboard',
@@ -19,6 +22,59 @@ st.set_page_config(
 with open('style.css') as f:
     st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
 
+# --- CACHE DE ETAPAS ---
+# Cada etapa se guarda según el hash del contenido del archivo y sus parámetros,
+# así un cambio en filtros o gráficos no repite la lectura, el clima ni el modelo.
+# max_entries limita la memoria (se descartan las entradas usadas hace más tiempo).
+# Se usa cache_resource: todas las sesiones comparten el mismo DataFrame en lugar de
+# recibir una copia deserializada en cada ejecución, por eso las etapas y la página
+# no modifican los frames que reciben (agregan columnas sobre copias superficiales).
+CACHE_ENTRIES = 4
+
+def hash_archivo(uploaded_file):
+    """
+    Hash SHA-256 del contenido del archivo subido (calculado una vez por archivo).
+    """
+    hashes = st.session_state.setdefault("_hash_archivos", {})
+    if uploaded_file.file_id not in hashes:
+        hashes[uploaded_file.file_id] = hashlib.sha256(uploaded_file.getvalue()).hexdigest()
+    return hashes[uploaded_file.file_id]
+
+@st.cache_resource(max_entries=CACHE_ENTRIES, show_spinner=False)
+def cargar_datos(file_hash, _uploaded_file):
+    _uploaded_file.seek(0)
+    return load_scada_csv(_uploaded_file)
+
+@st.cache_resource(max_entries=CACHE_ENTRIES, show_spinner="Consultando clima...")
+def cargar_clima(file_hash, lat, lon, proyecto, _uploaded_file):
+    df = cargar_datos(file_hash, _uploaded_file)
+    df = attach_weather(df, lat, lon)
+    # Guardar los datos procesados para poder reabrir el proyecto sin volver a subir el CSV
+    if proyecto is not None:
+        write_project(df, proyecto)
+    return df
+
+@st.cache_resource(max_entries=CACHE_ENTRIES, show_spinner=False)
+def calcular_modelo(file_hash, lat, lon, metodo, proyecto, _uploaded_file):
+    df = cargar_clima(file_hash, lat, lon, proyecto, _uploaded_file)
+    return run_model(df, metodo)
+
+@st.cache_resource(max_entries=CACHE_ENTRIES, show_spinner=False)
+def calcular_rollups(clave, _df):
+    """
+    Agregados por hora, día, semana y mes del resultado del modelo identificado por `clave`.
+    """
+    return build_rollups(_df)
+
+@st.cache_resource(max_entries=CACHE_ENTRIES, show_spinner="Cargando datos guardados...")
+def cargar_guardados(proyecto, version):
+    return read_project(proyecto)
+
+@st.cache_resource(max_entries=CACHE_ENTRIES, show_spinner=False)
+def calcular_modelo_guardado(proyecto, version, metodo):
+    df = cargar_guardados(proyecto, version)
+    return run_model(df, metodo)
+
 # --- SIDEBAR ---
 with st.sidebar:
     # Logo
@@ -33,8 +89,21 @@ with st.sidebar:
         """,
         unsafe_allow_html=True,
     )
-    ubicaciones_path = os.path.join(os.path.dirname(__file__), "ubi", "ubicaciones.xlsx")
-    ubicaciones_df = load_ubicaciones(ubicaciones_path)
+    vista = st.radio("Vista", ["Proyecto", "Flota"], horizontal=True)
+
+# --- VISTA DE FLOTA (resumen precalculado por las corridas batch) ---
+if vista == "Flota":
+    metodos_resumen = summary_methods()
+    st.subheader("Flota de proyectos")
+    if metodos_resumen:
+        metodo_flota = st.sidebar.selectbox("Método", metodos_resumen)
+        show_fleet_overview(load_fleet_summary(metodo_flota))
+    else:
+        st.info("Todavía no hay resúmenes: ejecuta batch_runner.py para calcularlos.")
+    st.stop()
+
+with st.sidebar:
+    ubicaciones_df = load_ubicaciones()
     proyectos = ubicaciones_df["Proyecto"].tolist()
     selected_proyecto = st.selectbox("Selecciona un proyecto", proyectos + ["Agregar nuevo"], key="proyecto_select")
 
@@ -43,22 +112,21 @@ with st.sidebar:
         nueva_lat = st.number_input("Latitud", format="%.6f", key="nueva_lat")
         nueva_lon = st.number_input("Longitud", format="%.6f", key="nueva_lon")
         if st.button("Guardar nuevo proyecto"):
-            ubicaciones_df = add_proyecto(ubicaciones_df, nuevo_nombre, nueva_lat, nueva_lon)
-            save_ubicaciones(ubicaciones_df, ubicaciones_path)
-            st.success("Proyecto agregado. Recarga la página para verlo en la lista.")
+            if add_proyecto(nuevo_nombre, nueva_lat, nueva_lon):
+                st.success("Proyecto agregado. Recarga la página para verlo en la lista.")
+            else:
+                st.warning("Ingresa un nombre que no esté en uso.")
         lat = nueva_lat
         lon = nueva_lon
     else:
-        row = ubicaciones_df[ubicaciones_df["Proyecto"] == selected_proyecto].iloc[0]
+        row = get_proyecto(selected_proyecto)
         lat = st.number_input("Latitud", value=float(row["Latitud"]), format="%.6f", key="edit_lat")
         lon = st.number_input("Longitud", value=float(row["Longitud"]), format="%.6f", key="edit_lon")
         if st.button("Actualizar ubicación"):
-            ubicaciones_df = update_proyecto(ubicaciones_df, selected_proyecto, lat, lon)
-            save_ubicaciones(ubicaciones_df, ubicaciones_path)
+            update_proyecto(selected_proyecto, lat, lon)
             st.success("Ubicación actualizada.")
         if st.button("Eliminar proyecto"):
-            ubicaciones_df = delete_proyecto(ubicaciones_df, selected_proyecto)
-            save_ubicaciones(ubicaciones_df, ubicaciones_path)
+            delete_proyecto(selected_proyecto)
             st.success("Proyecto eliminado. Recarga la página para actualizar la lista.")
             
     # Agregar selectbox para método de soiling
@@ -70,7 +138,12 @@ with st.sidebar:
     
     st.subheader("Carga y filtros de datos")
     uploaded_file = st.file_uploader("Selecciona tu archivo CSV", type=["csv"])
-    
+    proyecto_guardado = selected_proyecto if selected_proyecto != "Agregar nuevo" else None
+
+    # Sin archivo nuevo se pueden reabrir los datos ya guardados del proyecto
+    usar_guardados = False
+    if uploaded_file is None and proyecto_guardado in list_projects():
+        usar_guardados = st.checkbox("Usar datos guardados del proyecto", value=True)
 
     df = None
     filtered_df = None
@@ -83,33 +156,28 @@ with st.sidebar:
     threshold = None
     chart_type = None
         
-    if uploaded_file is not None:
+    if uploaded_file is not None or usar_guardados:
         try:
-         
-            df = pd.read_csv(uploaded_file, parse_dates=['DateTime'])
-            df = df.sort_values('DateTime')
-            df['Soiling Ratio'] = pd.to_numeric(df['Soiling Ratio'], errors='coerce')
-            df = df.dropna(subset=['Soiling Ratio'])
-            
-            #df = apply_soiling_method(df, metodo_soiling)
-            
-            # Filtrar solo horas entre 6:00 y 20:00 (8 pm)
-            df['hour'] = df['DateTime'].dt.hour
-            df = df[(df['hour'] >= 6) & (df['hour'] <= 20)]
-            df = df.drop(columns=['hour'])  # Opcional, para limpiar la columna extra
-
-            df['DateTime_hour'] = df['DateTime'].dt.floor('H')
-
-             
-            with st.spinner("Consultando clima..."):
-                df['Clima'] = get_openmeteo_events(df['DateTime'], lat, lon)
-                
-            # Aplicar método de soiling DESPUÉS de obtener clima
-            df = apply_soiling_method(df, metodo_soiling)
+            if uploaded_file is not None:
+                # Lectura, clima y modelo quedan en cache según el contenido del archivo
+                file_hash = hash_archivo(uploaded_file)
+                df, normalizacion = calcular_modelo(file_hash, lat, lon, metodo_soiling, proyecto_guardado, uploaded_file)
+                clave_modelo = (file_hash, lat, lon, metodo_soiling, proyecto_guardado)
+            else:
+                version = project_version(proyecto_guardado)
+                df, normalizacion = calcular_modelo_guardado(proyecto_guardado, version, metodo_soiling)
+                clave_modelo = (proyecto_guardado, version, metodo_soiling)
+            rollups = calcular_rollups(clave_modelo, df)
+            if normalizacion is not None:
+                if normalizacion["nivel"] == "warning":
+                    st.warning(normalizacion["mensaje"])
+                else:
+                    st.info(normalizacion["mensaje"])
             st.info(f"✓ Método {metodo_soiling} aplicado correctamente")
 
-            min_date = df['DateTime'].min().date()
-            max_date = df['DateTime'].max().date()
+            # df está ordenado por DateTime: el primer y el último registro delimitan el rango
+            min_date = df['DateTime'].iloc[0].date()
+            max_date = df['DateTime'].iloc[-1].date()
 
                 # Toggle para mostrar comparación (solo si hay modelo)
             if metodo_soiling != "Sin modelo":
@@ -129,20 +197,12 @@ with st.sidebar:
                     max_value=max_date,
                     value=(min_date, max_date)
                 )
-                mask = (df['DateTime'].dt.date >= date_range[0]) & (df['DateTime'].dt.date <= date_range[1])
-                filtered_df = df.loc[mask].copy()
+                filtered_df = filter_date_range(df, date_range[0], date_range[1])
             else:
-                filtered_df = df.copy()
+                filtered_df = filter_date_range(df)
 
-            period = st.selectbox("Agrupar por:", ["Día", "Semana", "Mes", "Todo el histórico"])
-            if period == "Semana":
-                filtered_df['Periodo'] = filtered_df['DateTime'].dt.to_period('W').apply(lambda r: r.start_time)
-            elif period == "Mes":
-                filtered_df['Periodo'] = filtered_df['DateTime'].dt.to_period('M').apply(lambda r: r.start_time)
-            elif period == "Día":
-                filtered_df['Periodo'] = filtered_df['DateTime'].dt.date
-            else:
-                filtered_df['Periodo'] = 'Histórico'
+            # Cambiar el período sólo recorta los agregados precalculados
+            period = st.selectbox("Agrupar por:", ["Hora", "Día", "Semana", "Mes", "Todo el histórico"], index=1)
 
             threshold = st.slider("Umbral de alerta para limpieza (%)", min_value=70, max_value=100, value=90)
             threshold = threshold / 100.0
@@ -169,17 +229,18 @@ if 'filtered_df' in locals() and filtered_df is not None and not filtered_df.emp
     # ========== LÓGICA DE GRAFICACIÓN CON TOGGLE ==========
     if mostrar_comparacion and 'Soiling Ratio Original' in filtered_df.columns:
         # GRÁFICO COMPARATIVO CON ZOOM MEJORADO
-        chart_data = filtered_df.groupby('Periodo').agg({
-            'Soiling Ratio': 'mean',
-            'Soiling Ratio Original': 'mean'
-        }).reset_index()
+        chart_data = rollup_slice(rollups, period, *(date_range or (None, None)))
         
+        # Puntos a dibujar: la serie se reduce si es larga (las métricas usan chart_data completo)
+        plot_data = downsample(chart_data, 'Periodo', ['Soiling Ratio', 'Soiling Ratio Original'])
+        trace_class = scatter_class(len(plot_data))
+
         fig = go.Figure()
         
         # Línea de datos originales
-        fig.add_trace(go.Scatter(
-            x=chart_data['Periodo'], 
-            y=chart_data['Soiling Ratio Original'],
+        fig.add_trace(trace_class(
+            x=plot_data['Periodo'], 
+            y=plot_data['Soiling Ratio Original'],
             mode='lines+markers',
             name='📊 Datos Medidos',
             line=dict(color='#FF6B6B', width=3),
@@ -188,9 +249,9 @@ if 'filtered_df' in locals() and filtered_df is not None and not filtered_df.emp
         ))
         
         # Línea del modelo
-        fig.add_trace(go.Scatter(
-            x=chart_data['Periodo'], 
-            y=chart_data['Soiling Ratio'],
+        fig.add_trace(trace_class(
+            x=plot_data['Periodo'], 
+            y=plot_data['Soiling Ratio'],
             mode='lines+markers',
             name=f'🔬 Modelo {metodo_soiling}',
             line=dict(color='#4ECDC4', width=3),
@@ -266,33 +327,6 @@ if 'filtered_df' in locals() and filtered_df is not None and not filtered_df.emp
         }
         
         st.plotly_chart(fig, use_container_width=True, config=config)
-    
-        fig.update_layout(
-            title=f'Comparación: Datos Medidos vs Modelo {metodo_soiling}',
-            xaxis_title='Periodo',
-            yaxis_title='Soiling Ratio',
-            yaxis=dict(
-                range=[max(0, y_min - y_padding), min(1, y_max + y_padding)],  # Escala de 0 a 1
-                tickformat='.2f',  # Formato decimal, no porcentaje
-                tickmode='linear',
-                tick0=0,
-                dtick=0.05  # Incrementos de 0.05
-            ),
-            hovermode='x unified',
-            legend=dict(
-                yanchor="top", 
-                y=0.99, 
-                xanchor="left", 
-                x=0.01,
-                bgcolor="rgba(255,255,255,0.9)",
-                bordercolor="lightgray",
-                borderwidth=1
-            ),
-            template="plotly_white",
-            height=500
-        )
-        
-        st.plotly_chart(fig, use_container_width=True)
         
         # Métricas de comparación
         st.subheader("📈 Métricas de Comparación")
@@ -346,33 +380,25 @@ if 'filtered_df' in locals() and filtered_df is not None and not filtered_df.emp
         
     else:
         # GRÁFICO SIMPLE (sin comparación)
-        chart_data = filtered_df.groupby('Periodo')['Soiling Ratio'].mean().reset_index()
+        chart_data = rollup_slice(rollups, period, *(date_range or (None, None)))
         show_chart(chart_data, chart_type)
     # ======================================================
 
-    # KPIs
-    sr_avg = filtered_df['Soiling Ratio'].mean()
-    sr_loss = (1 - sr_avg) * 100
-    days_below = get_days_below_threshold(filtered_df, 'Soiling Ratio', threshold)
-    total_days = get_unique_days_count(filtered_df)
-    
-    if sr_avg >= threshold:
-        status = ("🟢 Normal", "green")
-    elif sr_avg >= threshold - 0.03:
-        status = ("🟡 Advertencia", "orange")
-    else:
-        status = ("🔴 Limpieza necesaria", "red")
-        
-    show_kpis(sr_avg, sr_loss, days_below, status, total_days)
+    # KPIs (el resumen diario se calcula una vez y lo comparten KPIs y recomendaciones)
+    daily_stats = daily_summary(filtered_df)
+    kpis = compute_kpis(filtered_df, threshold, daily_stats)
+    show_kpis(kpis["sr_avg"], kpis["sr_loss"], kpis["days_below"], kpis["status"], kpis["total_days"])
 
     # Agregar sección de recomendaciones
     st.subheader(f"📋 Recomendaciones basadas en {metodo_soiling}")
-    recomendaciones = generar_recomendaciones(filtered_df, metodo_soiling, threshold)
+    recomendaciones = build_recommendations(filtered_df, metodo_soiling, threshold, daily_stats)
     st.markdown(recomendaciones)
     
     st.subheader("Clima por fecha")
-    filtered_df['Clima Icono'] = filtered_df['Clima'].apply(get_weather_icon)
-    st.dataframe(filtered_df[['DateTime', 'Soiling Ratio', 'Clima', 'Clima Icono']])
+    # Los íconos se calculan por categoría de Clima, no por registro
+    tabla_clima = filtered_df[['DateTime', 'Soiling Ratio', 'Clima']].assign(
+        **{'Clima Icono': filtered_df['Clima'].map(get_weather_icon)})
+    st.dataframe(tabla_clima)
     
     # Recomendaciones de limpieza
     st.subheader("Fechas recomendadas para limpieza")
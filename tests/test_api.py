@@ -0,0 +1,94 @@
+import asyncio
+import time
+
+import pytest
+
+import api
+from openmeteo_stub import OpenMeteoStub, StubConfig
+
+def _locations(n, start_date="2023-01-01", end_date="2023-01-31"):
+    """
+    n ubicaciones en celdas distintas de la grilla (una consulta por ubicación y tramo).
+    """
+    return {f"p{i}": (-33.0 - i, -70.0, start_date, end_date) for i in range(n)}
+
+def test_split_date_range_covers_range_in_chunks():
+    chunks = api.split_date_range("2023-01-01", "2023-12-31")
+
+    assert chunks[0] == ("2023-01-01", "2023-03-31")
+    assert chunks[-1] == ("2023-12-27", "2023-12-31")
+    assert len(chunks) == 5
+    assert api.split_date_range("2023-01-01", "2023-01-01") == [("2023-01-01", "2023-01-01")]
+    assert api.split_date_range("2023-01-02", "2023-01-01") == []
+
+@pytest.fixture
+def stub(monkeypatch, request):
+    with OpenMeteoStub(request.param) as server:
+        monkeypatch.setattr(api, "ARCHIVE_URL", server.url)
+        monkeypatch.setattr(api, "BACKOFF_BASE", 0.05)
+        yield server
+
+@pytest.mark.parametrize("stub", [StubConfig()], indirect=True)
+def test_long_range_is_fetched_by_chunks(stub):
+    report = api.fetch_histories(_locations(1, "2023-01-01", "2023-12-31"), use_cache=False, offline=False)
+
+    history = report.histories["p0"]
+    assert report.requests == stub.stats.consultas == 5
+    assert len(history) == 365 * 24
+    assert history["time"].is_monotonic_increasing and history["time"].is_unique
+
+@pytest.mark.parametrize("stub", [StubConfig(latency=0.1)], indirect=True)
+def test_fetch_histories_respects_rate_and_concurrency(stub):
+    locations = _locations(8)
+
+    t0 = time.perf_counter()
+    report = api.fetch_histories(locations, use_cache=False, offline=False, max_concurrency=2, rate_limit=20)
+    elapsed = time.perf_counter() - t0
+
+    assert report.ok
+    assert report.requests == stub.stats.consultas == 8
+    # 8 consultas de 0.1 s, de a 2 en curso: al menos 4 rondas
+    assert elapsed >= 0.4
+    assert all(len(history) == 31 * 24 for history in report.histories.values())
+
+@pytest.mark.parametrize("stub", [StubConfig()], indirect=True)
+def test_fetch_histories_spaces_requests_by_rate_limit(stub):
+    t0 = time.perf_counter()
+    report = api.fetch_histories(_locations(8), use_cache=False, offline=False, max_concurrency=8, rate_limit=10)
+    elapsed = time.perf_counter() - t0
+
+    assert report.ok
+    # 8 consultas a 10 por segundo: la última no sale antes de 0.7 s
+    assert elapsed >= 0.7
+
+@pytest.mark.parametrize("stub", [StubConfig(rate_limit=4)], indirect=True)
+def test_fetch_histories_retries_rate_limited_requests(stub):
+    report = api.fetch_histories(_locations(8), use_cache=False, offline=False, max_concurrency=8, rate_limit=0)
+
+    stats = stub.stats.as_dict()
+    assert report.ok
+    assert stats["limitadas"] > 0
+    assert stats["ok"] == 8
+    assert report.requests == stats["consultas"] == stats["ok"] + stats["limitadas"]
+
+@pytest.mark.parametrize("stub", [StubConfig(error_rate=1.0, error_status=400)], indirect=True)
+def test_fetch_histories_does_not_retry_client_errors(stub):
+    report = api.fetch_histories(_locations(2), use_cache=False, offline=False)
+
+    assert set(report.errors) == {"p0", "p1"}
+    assert report.requests == stub.stats.consultas == 2
+    assert all(h is None for h in report.histories.values())
+
+@pytest.mark.parametrize("stub", [StubConfig()], indirect=True)
+def test_fetch_histories_inside_running_event_loop(stub):
+    async def from_loop():
+        # Desde un event loop activo la versión sincrónica corre en otro hilo
+        report = api.fetch_histories(_locations(2), use_cache=False, offline=False)
+        return report, await api.fetch_histories_async(_locations(2), use_cache=False, offline=False)
+
+    sync_report, async_report = asyncio.run(from_loop())
+
+    assert sync_report.ok and async_report.ok
+    assert stub.stats.consultas == 4
+    for key, history in sync_report.histories.items():
+        assert history.equals(async_report.histories[key])
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from calibration import KIMBER_GRID, calibrate
+from soiling_methods import calculate_kimber_ratio
+
+KNOWN = {"soiling_rate": 0.003, "cleaning_threshold": 15.0, "grace_period_days": 5, "max_soiling": 0.2}
+
+def _weather(days=200):
+    """
+    Clima horario con lluvias de 12, 30, 18 y 30 mm (sólo las de 15 mm o más limpian con KNOWN).
+    """
+    n = days * 24
+    precipitation = np.zeros(n)
+    for day, mm in [(20, 12.0), (40, 30.0), (110, 18.0), (150, 30.0)]:
+        precipitation[day * 24 + 2:day * 24 + 8] = mm / 6
+    return pd.DataFrame({
+        "DateTime": pd.date_range("2023-01-01", periods=n, freq="h"),
+        "precipitation": precipitation,
+        "Clima": np.where(precipitation > 0, "Lluvia", "Nublado"),
+    })
+
+def _measured(scale=1.0, offset=0.0):
+    df = _weather()
+    sr = calculate_kimber_ratio(df.copy(), **KNOWN)["Soiling Ratio Kimber"].to_numpy(dtype=float)
+    return df.assign(**{"Soiling Ratio": scale * sr + offset})
+
+@pytest.mark.parametrize("scale", [1.0, 100.0])
+def test_calibration_recovers_known_parameters(scale):
+    result = calibrate(_measured(scale), "Kimber", refine=False)
+
+    assert result["parametros"] == pytest.approx(KNOWN)
+    assert result["rmse"] == pytest.approx(0.0, abs=1e-6)
+
+def test_calibration_uses_raw_level_of_offset_series():
+    # Planta que nunca vuelve a 1: SR medido entre ~0.77 y 0.95. Estirarlo a [0, 1]
+    # dejaba los parámetros en los bordes de la grilla con RMSE ~0.36
+    df = _measured(scale=0.95)
+    assert df["Soiling Ratio"].max() == pytest.approx(0.95)
+
+    result = calibrate(df, "Kimber", refine=False)
+    params = result["parametros"]
+
+    assert params["cleaning_threshold"] == KNOWN["cleaning_threshold"]
+    assert params["max_soiling"] == pytest.approx(KNOWN["max_soiling"])
+    assert min(KIMBER_GRID["soiling_rate"]) < params["soiling_rate"] < max(KIMBER_GRID["soiling_rate"])
+    assert result["rmse"] < 0.03
@@ -0,0 +1,44 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from cleaning_optimizer import _cost_tables, optimal_schedule, schedule_cost
+
+def _simulated_cost(loss, value, cleanings, cleaning_cost, horizon):
+    """
+    Costo total simulando día a día: tras una limpieza la pérdida vuelve a acumularse con los
+    aumentos diarios del modelo, sin superar la pérdida sin limpiezas, durante `horizon` días.
+    """
+    deposited = np.concatenate(([0.0], np.cumsum(np.maximum(np.diff(loss), 0.0))))
+    total, last = cleaning_cost * len(cleanings), None
+    for t in range(len(loss)):
+        if t in cleanings:
+            last = t
+        if last is None or t - last >= horizon:
+            day_loss = loss[t]
+        else:
+            day_loss = min(loss[t], deposited[t] - deposited[last])
+        total += day_loss * value[t]
+    return total
+
+@pytest.mark.parametrize("seed", range(40))
+def test_optimal_schedule_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(1, 11))
+    horizon = int(rng.integers(1, n + 1))
+    loss = np.clip(np.cumsum(rng.uniform(-0.01, 0.02, n)), 0.0, 1.0)
+    if seed % 2:
+        # Una lluvia que limpia a mitad del período
+        loss[rng.integers(0, n)] = 0.0
+    value = rng.uniform(50.0, 300.0, n)
+    cleaning_cost = float(rng.uniform(0.0, 20.0))
+    natural, after = _cost_tables(loss, value, horizon)
+
+    brute_force = min(_simulated_cost(loss, value, set(days), cleaning_cost, horizon)
+                      for size in range(n + 1) for days in itertools.combinations(range(n), size))
+    cleanings, total = optimal_schedule(natural, after, cleaning_cost, horizon)
+
+    assert total == pytest.approx(brute_force, abs=1e-9)
+    assert schedule_cost(natural, after, cleanings, cleaning_cost, horizon) == pytest.approx(total, abs=1e-9)
+    assert _simulated_cost(loss, value, set(cleanings), cleaning_cost, horizon) == pytest.approx(total, abs=1e-9)
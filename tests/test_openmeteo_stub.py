@@ -0,0 +1,44 @@
+import json
+
+import requests
+
+from openmeteo_stub import ARCHIVE_PATH, OpenMeteoStub, StubConfig, fixture_name, synthetic_response
+
+PARAMS = {"latitude": "-33.45", "longitude": "-70.66", "start_date": "2023-01-01", "end_date": "2023-01-03",
+          "hourly": "temperature_2m,precipitation,cloudcover"}
+
+def test_synthetic_response_is_deterministic():
+    first = synthetic_response(PARAMS)
+
+    assert first == synthetic_response(PARAMS)
+    assert len(first["hourly"]["time"]) == 3 * 24
+    assert first["hourly"]["time"][-1] == "2023-01-03T23:00"
+    assert synthetic_response(PARAMS, seed=1) != first
+
+def test_replay_serves_fixtures_and_counts_missing(tmp_path):
+    recorded = synthetic_response(PARAMS)
+    (tmp_path / fixture_name(PARAMS)).write_text(json.dumps(recorded))
+    other = {**PARAMS, "end_date": "2023-01-05"}
+
+    with OpenMeteoStub(StubConfig(modo="replay", fixtures_dir=str(tmp_path))) as server:
+        hit = requests.get(server.url, params=PARAMS, timeout=5)
+        miss = requests.get(server.url, params=other, timeout=5)
+        stats = requests.get(server.url.replace(ARCHIVE_PATH, "/stats"), timeout=5).json()
+
+    assert hit.status_code == 200
+    assert hit.json() == recorded
+    assert miss.status_code == 404
+    assert stats["consultas"] == 2
+    assert stats["ok"] == 1
+    assert stats["sin_fixture"] == 1
+
+def test_rate_limit_answers_429(tmp_path):
+    # Sin fixtures cada consulta admitida responde 404 al instante
+    with OpenMeteoStub(StubConfig(modo="replay", fixtures_dir=str(tmp_path), rate_limit=2)) as server:
+        statuses = [requests.get(server.url, params=PARAMS, timeout=5).status_code for _ in range(6)]
+        limited = server.stats.limitadas
+
+    assert statuses[:2] == [404, 404]
+    assert 429 in statuses
+    assert statuses.count(404) + statuses.count(429) == 6
+    assert limited == statuses.count(429)
@@ -0,0 +1,162 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from calibration import somosclean_ratio_batch
+from pipeline import load_model_state, run_model_incremental, save_model_state
+from soiling_methods import calculate_kimber_ratio, calculate_somosclean_ratio
+
+def _clear_sky(n, freq="h"):
+    """
+    Tramo largo sin lluvias (factor 1.1 en todas las filas, sin ningún reinicio de eqD).
+    """
+    return pd.DataFrame({
+        "DateTime": pd.date_range("2020-01-01", periods=n, freq=freq),
+        "Clima": "Despejado",
+        "precipitation": 0.0,
+    })
+
+@pytest.mark.parametrize("time_basis", ["transcurrido", "fila"])
+def test_somosclean_numpy_matches_reference_without_resets(time_basis):
+    df = _clear_sky(9000)
+    numpy_sr = calculate_somosclean_ratio(df, time_basis=time_basis)["Soiling Ratio SOMOSclean"].to_numpy()
+    reference_sr = calculate_somosclean_ratio(df, time_basis=time_basis, engine="referencia")[
+        "Soiling Ratio SOMOSclean"].to_numpy()
+
+    assert np.isfinite(numpy_sr).all()
+    np.testing.assert_allclose(numpy_sr, reference_sr, atol=1e-6)
+    assert numpy_sr[-1] == pytest.approx(0.75)
+
+@pytest.mark.parametrize("time_basis", ["transcurrido", "fila"])
+def test_somosclean_numpy_matches_reference_with_rain(time_basis):
+    rng = np.random.default_rng(0)
+    n = 5000
+    df = pd.DataFrame({
+        "DateTime": pd.date_range("2020-01-01", periods=n, freq="h"),
+        "Clima": rng.choice(["Despejado", "Lluvia", "Nublado"], n, p=[0.8, 0.05, 0.15]),
+        "precipitation": rng.exponential(2.0, n),
+    })
+    numpy_df, numpy_state = calculate_somosclean_ratio(df, time_basis=time_basis, return_state=True)
+    reference_df, reference_state = calculate_somosclean_ratio(df, time_basis=time_basis, engine="referencia",
+                                                               return_state=True)
+
+    np.testing.assert_allclose(numpy_df["Soiling Ratio SOMOSclean"], reference_df["Soiling Ratio SOMOSclean"],
+                               atol=1e-6)
+    assert numpy_state["eqD"] == pytest.approx(reference_state["eqD"])
+
+def test_somosclean_batch_finite_on_long_row_grid():
+    n = 20000
+    params = {"heavy_rain_threshold": [5.0, 3.0], "delta_SL_sat": [0.25, 0.2], "k": [15.0, 30.0]}
+    sr = somosclean_ratio_batch(np.full(n, "Despejado", dtype=object), np.zeros(n),
+                                np.arange(1, n + 1, dtype=float), params)
+
+    assert np.isfinite(sr).all()
+    np.testing.assert_allclose(sr[:, -1], [0.75, 0.8])
+
+def _hourly_rain(n=4800, seed=3):
+    """
+    Registros horarios con lluvias esporádicas: varios días superan los 25 mm y abren un
+    período de gracia.
+    """
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "DateTime": pd.date_range("2020-01-01", periods=n, freq="h"),
+        "precipitation": np.where(rng.random(n) < 0.01, rng.exponential(20.0, n), 0.0),
+    })
+
+def _kimber_hourly_loop(df, cleaning_threshold=25.0, soiling_rate=0.0015, grace_period_days=15,
+                        max_soiling=0.30):
+    """
+    Cálculo anterior de Kimber: una hora por fila, con la lluvia total de cada día.
+    """
+    daily = df.groupby(df["DateTime"].dt.date)["precipitation"].sum()
+    loss, grace, sr = 0.0, 0, []
+    for fecha in df["DateTime"].dt.date:
+        if daily[fecha] >= cleaning_threshold:
+            loss, grace = 0.0, grace_period_days
+        elif grace > 0:
+            grace -= 1 / 24
+        else:
+            loss = min(loss + soiling_rate / 24, max_soiling)
+        sr.append(1 - loss)
+    return np.array(sr)
+
+@pytest.mark.parametrize("time_basis", ["transcurrido", "fila"])
+def test_kimber_numpy_matches_reference(time_basis):
+    df = _hourly_rain()
+    numpy_df, numpy_state = calculate_kimber_ratio(df, time_basis=time_basis, return_state=True)
+    reference_df, reference_state = calculate_kimber_ratio(df, time_basis=time_basis, engine="referencia",
+                                                           return_state=True)
+
+    np.testing.assert_allclose(numpy_df["Soiling Ratio Kimber"], reference_df["Soiling Ratio Kimber"],
+                               atol=1e-9)
+    assert numpy_state["cumulative_loss"] == pytest.approx(reference_state["cumulative_loss"])
+    assert numpy_state["grace_counter"] == pytest.approx(reference_state["grace_counter"])
+
+def test_kimber_hourly_data_matches_previous_loop():
+    df = _hourly_rain()
+    previous = _kimber_hourly_loop(df)
+    elapsed = calculate_kimber_ratio(df)["Soiling Ratio Kimber"].to_numpy()
+    by_row = calculate_kimber_ratio(df, time_basis="fila")["Soiling Ratio Kimber"].to_numpy()
+
+    np.testing.assert_allclose(elapsed, previous, atol=1e-6)
+    # Por fila el período de gracia termina una hora antes: a lo más soiling_rate/24 de diferencia
+    assert (np.abs(by_row - previous) > 1e-6).any()
+    np.testing.assert_allclose(by_row, previous, atol=0.0015 / 24 + 1e-6)
+
+def _weather_series(n_days=60, freq="h", seed=1):
+    """
+    Registros con lluvias esporádicas (algunas de más de 25 mm en el día) y clima variado.
+    """
+    rng = np.random.default_rng(seed)
+    date_times = pd.date_range("2023-01-01", pd.Timestamp("2023-01-01") + pd.Timedelta(days=n_days),
+                               freq=freq, inclusive="left")
+    rainy_day = rng.random(n_days) < 0.15
+    precipitation = np.where(rainy_day[(date_times - date_times[0]).days] & (date_times.hour < 6),
+                             rng.uniform(0.5, 8.0, len(date_times)), 0.0)
+    return pd.DataFrame({
+        "DateTime": date_times,
+        "Soiling Ratio": 0.97,
+        "precipitation": precipitation,
+        "Clima": np.where(precipitation > 0, "Lluvia", rng.choice(["Despejado", "Nublado"], len(date_times))),
+    })
+
+def _resume(df, metodo, split, tmp_path):
+    """
+    Calcula df[:split], guarda el estado en JSON y continúa con df[split:].
+    """
+    head, state = run_model_incremental(df.iloc[:split], metodo)
+    path = tmp_path / "estado.json"
+    save_model_state(state, path)
+    tail, _ = run_model_incremental(df.iloc[split:], metodo, load_model_state(path))
+    return head, tail
+
+@pytest.mark.parametrize("metodo", ["Kimber", "SOMOSclean"])
+@pytest.mark.parametrize("freq", ["h", "15min"])
+def test_resume_at_day_boundary_matches_full_run(metodo, freq, tmp_path):
+    df = _weather_series(freq=freq)
+    full, _ = run_model_incremental(df, metodo)
+    split = int(np.searchsorted(df["DateTime"], pd.Timestamp("2023-01-25")))
+
+    head, tail = _resume(df, metodo, split, tmp_path)
+
+    np.testing.assert_array_equal(pd.concat([head, tail])["Soiling Ratio"], full["Soiling Ratio"])
+
+@pytest.mark.parametrize("metodo", ["Kimber", "SOMOSclean"])
+def test_resume_mid_day_matches_full_run(metodo, tmp_path):
+    df = _weather_series()
+    full, _ = run_model_incremental(df, metodo)
+    # A las 03:00 de un día que llega a 25 mm: la mañana cortada todavía no alcanza el umbral
+    dates = df["DateTime"].dt.normalize()
+    rain = df.groupby(dates)["precipitation"].sum()
+    split = int(np.searchsorted(df["DateTime"], rain.index[rain >= 25.0][0] + pd.Timedelta(hours=3)))
+
+    head, tail = _resume(df, metodo, split, tmp_path)
+
+    # La continuación siempre es exacta
+    np.testing.assert_array_equal(tail["Soiling Ratio"], full["Soiling Ratio"].iloc[split:])
+    # Lo ya entregado también, salvo (con Kimber) las filas del día cortado
+    same = np.ones(split, dtype=bool)
+    if metodo == "Kimber":
+        same = (dates.iloc[:split] != dates.iloc[split]).to_numpy()
+    np.testing.assert_array_equal(head["Soiling Ratio"][same], full["Soiling Ratio"].iloc[:split][same])
@@ -0,0 +1,20 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import build_daily_stats
+
+def _scada(freq, days=3):
+    """
+    Registros SCADA con la lluvia horaria de Open-Meteo repetida en cada registro de la hora.
+    """
+    date_times = pd.date_range("2023-01-01", pd.Timestamp("2023-01-01") + pd.Timedelta(days=days),
+                               freq=freq, inclusive="left")
+    hourly_rain = np.where(date_times.hour < 4, 3.0, 0.0) * (date_times.day == 2)
+    return pd.DataFrame({"DateTime": date_times, "Soiling Ratio": 0.97, "precipitation": hourly_rain})
+
+@pytest.mark.parametrize("freq", ["h", "15min", "5min"])
+def test_daily_precipitation_does_not_depend_on_sampling(freq):
+    daily = build_daily_stats(_scada(freq))
+
+    np.testing.assert_allclose(daily["precipitation"], [0.0, 12.0, 0.0])
@@ -0,0 +1,52 @@
+import json
+
+import api
+import weather_cache
+from openmeteo_stub import OpenMeteoStub, StubConfig, fixture_name, synthetic_response
+
+def test_group_by_cell_joins_nearby_locations():
+    locations = {"a": (-33.41, -70.71, "2023-01-01", "2023-01-31"),
+                 "b": (-33.38, -70.68, "2023-01-01", "2023-01-31"),
+                 "lejos": (-23.65, -70.40, "2023-01-01", "2023-01-31")}
+
+    cells = api.group_by_cell(locations)
+
+    assert sorted(cells.values()) == [["a", "b"], ["lejos"]]
+    assert cells[weather_cache.snap_coords(-33.41, -70.71)] == ["a", "b"]
+
+def test_fetch_histories_queries_each_cell_once(monkeypatch):
+    # Rangos solapados en la misma celda: se descarga una vez la unión (2023-01-01 a 2023-03-15)
+    locations = {"a": (-33.41, -70.71, "2023-01-01", "2023-02-15"),
+                 "b": (-33.38, -70.68, "2023-02-01", "2023-03-15")}
+    with OpenMeteoStub(StubConfig()) as server:
+        monkeypatch.setattr(api, "ARCHIVE_URL", server.url)
+        report = api.fetch_histories(locations, use_cache=False, offline=False)
+
+    assert report.ok
+    assert report.cells == 1
+    assert report.requests == server.stats.consultas == 1
+    assert len(report.histories["a"]) == 46 * 24
+    assert len(report.histories["b"]) == 43 * 24
+    overlap = report.histories["a"].merge(report.histories["b"], on="time")
+    assert len(overlap) == 15 * 24
+    assert (overlap["precipitation_x"] == overlap["precipitation_y"]).all()
+
+def test_fetch_histories_reports_errors_per_range(tmp_path, monkeypatch):
+    # 120 días = dos tramos (90 + 30 días); sólo el primero tiene fixture grabado
+    lat, lon = weather_cache.snap_coords(-33.45, -70.66)
+    first, second = api.split_date_range("2023-01-01", "2023-04-30")
+    params = {"latitude": lat, "longitude": lon, "start_date": first[0], "end_date": first[1]}
+    (tmp_path / fixture_name(params)).write_text(json.dumps(synthetic_response(params)))
+
+    monkeypatch.setattr(api, "BACKOFF_BASE", 0.05)
+    with OpenMeteoStub(StubConfig(modo="replay", fixtures_dir=str(tmp_path))) as server:
+        monkeypatch.setattr(api, "ARCHIVE_URL", server.url)
+        locations = {"completo": (-33.45, -70.66, "2023-01-01", "2023-04-30"),
+                     "primer_tramo": (-33.45, -70.66, "2023-01-10", "2023-02-10")}
+        report = api.fetch_histories(locations, use_cache=False, offline=False)
+
+    assert report.cells == 1
+    assert list(report.errors) == ["completo"]
+    assert len(report.errors["completo"]) == 1
+    assert report.errors["completo"][0].startswith(f"{second[0]} a {second[1]}: HTTP 404")
+    assert len(report.histories["primer_tramo"]) == 32 * 24
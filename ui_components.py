@@ -2,6 +2,8 @@ import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
 
+from downsampling import MAX_POINTS, WEBGL_THRESHOLD, downsample
+
 def show_kpis(sr_avg, sr_loss, days_below, status, total_days=None):
     col1, col2, col3, col4 = st.columns(4)
     with col1:
@@ -16,10 +18,55 @@ def show_kpis(sr_avg, sr_loss, days_below, status, total_days=None):
     with col4:
         st.markdown(f"<span style='color:{status[1]}'>{status[0]}</span>", unsafe_allow_html=True)
 
-def show_chart(data, chart_type):
+def show_fleet_overview(fleet):
     """
-    Muestra gráficos con zoom mejorado y mejor visualización de variaciones
+    Vista de flota: totales por estado y una tabla con un proyecto por fila
+    (primero los de menor Soiling Ratio actual). fleet viene de fleet_summary.load_fleet_summary.
     """
+    con_datos = fleet['SR Actual'].notna()
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Proyectos con resumen", f"{int(con_datos.sum())} de {len(fleet)}")
+    with col2:
+        sr_flota = fleet['SR Actual'].mean()
+        st.metric("Soiling Ratio actual (flota)", f"{sr_flota:.2%}" if con_datos.any() else "—")
+    with col3:
+        st.metric("Requieren limpieza", int(fleet['Estado'].eq("🔴 Limpieza necesaria").sum()))
+    with col4:
+        st.metric("En advertencia", int(fleet['Estado'].eq("🟡 Advertencia").sum()))
+
+    tabla = fleet.sort_values('SR Actual', na_position='last')
+    st.dataframe(
+        tabla[['Proyecto', 'Estado', 'SR Actual', 'Perdida (%)', 'Dias bajo umbral', 'Dias analizados',
+               'Ultima limpieza', 'Ultimo dato', 'Actualizado', 'Error']],
+        hide_index=True,
+        column_config={
+            'SR Actual': st.column_config.NumberColumn("SR actual", format="%.4f"),
+            'Perdida (%)': st.column_config.NumberColumn("Pérdida (%)", format="%.2f"),
+            'Dias bajo umbral': st.column_config.NumberColumn("Días bajo umbral"),
+            'Dias analizados': st.column_config.NumberColumn("Días analizados"),
+            'Ultima limpieza': st.column_config.DateColumn("Última limpieza"),
+            'Ultimo dato': st.column_config.DateColumn("Último dato"),
+            'Actualizado': st.column_config.DatetimeColumn("Actualizado"),
+        },
+    )
+
+def scatter_class(n_points):
+    """
+    Tipo de traza según la cantidad de puntos: WebGL (Scattergl) para series grandes, SVG para las chicas.
+    """
+    return go.Scattergl if n_points > WEBGL_THRESHOLD else go.Scatter
+
+def show_chart(data, chart_type, max_points=MAX_POINTS):
+    """
+    Muestra gráficos con zoom mejorado y mejor visualización de variaciones.
+    Las series largas se reducen a max_points puntos (LTTB para líneas y áreas,
+    mínimo/máximo por tramo para barras).
+    """
+    data = downsample(data, 'Periodo', 'Soiling Ratio', max_points,
+                      method="minmax" if chart_type == "Barras" else "lttb")
+    trace_class = scatter_class(len(data))
+
     # Calcular rango dinámico del eje Y para mejor visualización
     y_min = data['Soiling Ratio'].min()
     y_max = data['Soiling Ratio'].max()
@@ -36,7 +83,7 @@ def show_chart(data, chart_type):
     
     if chart_type == "Línea":
         fig = go.Figure()
-        fig.add_trace(go.Scatter(
+        fig.add_trace(trace_class(
             x=data['Periodo'],
             y=data['Soiling Ratio'],
             mode='lines+markers',
@@ -65,7 +112,7 @@ def show_chart(data, chart_type):
             height=500
         )
         
-    elif chart_type == "Barra":
+    elif chart_type == "Barras":
         fig = go.Figure()
         fig.add_trace(go.Bar(
             x=data['Periodo'],
@@ -91,7 +138,7 @@ def show_chart(data, chart_type):
         
     else:  # Área
         fig = go.Figure()
-        fig.add_trace(go.Scatter(
+        fig.add_trace(trace_class(
             x=data['Periodo'],
             y=data['Soiling Ratio'],
             mode='lines',
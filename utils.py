@@ -1,38 +1,83 @@
+import numpy as np
 import pandas as pd
 
-def get_consecutive_days_below(df, column, threshold):
+def build_daily_stats(df):
+    """
+    Resumen diario compartido por KPIs y recomendaciones (se construye una vez por rango filtrado).
+    Columnas: Date, Soiling Ratio (promedio), Soiling Ratio Original (promedio, si existe),
+    precipitation (suma del día, cada hora una vez: daily_precipitation), Clima (moda del día)
+    y n (cantidad de registros).
+    """
+    dates = df['DateTime'].dt.normalize()
+    agg = {'Soiling Ratio': 'mean'}
+    if 'Soiling Ratio Original' in df.columns:
+        agg['Soiling Ratio Original'] = 'mean'
+
+    grouped = df.groupby(dates.rename('Date'))
+    daily = grouped.agg(agg)
+    if 'precipitation' in df.columns:
+        # Misma regla que los modelos: cada hora de Open-Meteo se suma una sola vez por día
+        rain = pd.Series(daily_precipitation(df['DateTime'], df['precipitation']), index=df.index)
+        daily['precipitation'] = rain.groupby(dates.rename('Date')).first()
+    else:
+        daily['precipitation'] = 0.0
+    daily['n'] = grouped.size()
+
+    # Moda del clima por día: conteo por (día, clima); ante empate gana el primero en orden alfabético
+    if 'Clima' in df.columns:
+        counts = df.groupby([dates.rename('Date'), df['Clima'].rename('Clima')], observed=True).size()
+        counts = counts.reset_index(name='count').sort_values(['Date', 'count', 'Clima'],
+                                                              ascending=[True, False, True])
+        mode = counts.drop_duplicates(subset='Date').set_index('Date')['Clima']
+        daily['Clima'] = mode.reindex(daily.index).astype(object).fillna('Sin datos')
+    else:
+        daily['Clima'] = 'Sin datos'
+
+    return daily.reset_index()
+
+def daily_precipitation(date_times, precipitation, time_basis="transcurrido", last_time=None):
+    """
+    Precipitación diaria (mm) asignada a cada registro.
+    La precipitación de Open-Meteo es horaria y se repite en cada registro de la hora, así que
+    en modo "transcurrido" cada hora se suma una sola vez (con datos cada 5 minutos no se
+    multiplica por 12). La hora de last_time ya se contó en la corrida anterior.
+    En modo "fila" se suman todas las filas, como antes.
+    """
+    precipitation = pd.Series(np.asarray(precipitation, dtype=float), index=date_times.index)
+    dates = date_times.dt.normalize()
+    if time_basis == "transcurrido":
+        hours = date_times.dt.floor('h')
+        first_of_hour = ~hours.duplicated()
+        if last_time is not None:
+            first_of_hour &= hours != pd.Timestamp(last_time).floor('h')
+        precipitation = precipitation.where(first_of_hour, 0.0)
+    return precipitation.groupby(dates).transform('sum').to_numpy()
+
+def _longest_run(mask):
+    """
+    Largo de la racha más larga de valores True (conteo por tramos, sin bucles).
+    """
+    padded = np.concatenate(([False], np.asarray(mask, dtype=bool), [False]))
+    edges = np.diff(padded.astype(np.int8))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    return int((ends - starts).max()) if len(starts) else 0
+
+def get_consecutive_days_below(df, column, threshold, daily_stats=None):
     """
     Cuenta DÍAS ÚNICOS consecutivos donde el promedio diario está por debajo del umbral
     """
     if df.empty:
         return 0
     
-    # Agrupar por DÍA (no por registro) y calcular promedio diario
-    df_daily = df.copy()
-    df_daily['Date'] = df_daily['DateTime'].dt.date
-    daily_avg = df_daily.groupby('Date')[column].mean().reset_index()
-    daily_avg = daily_avg.sort_values('Date')
-    
-    # Encontrar días consecutivos por debajo del umbral
-    below_mask = daily_avg[column] < threshold
-    
-    if not below_mask.any():
-        return 0
-    
-    # Contar la racha consecutiva más larga de DÍAS
-    max_consecutive = 0
-    current_consecutive = 0
-    
-    for is_below in below_mask:
-        if is_below:
-            current_consecutive += 1
-            max_consecutive = max(max_consecutive, current_consecutive)
-        else:
-            current_consecutive = 0
+    # Promedio diario (por DÍA, no por registro)
+    if daily_stats is None:
+        daily_stats = build_daily_stats(df)
     
-    return max_consecutive
+    # Contar la racha consecutiva más larga de DÍAS por debajo del umbral
+    return _longest_run(daily_stats[column].to_numpy() < threshold)
 
-def get_days_below_threshold(df, column, threshold):
+def get_days_below_threshold(df, column, threshold, daily_stats=None):
     """
     Cuenta TOTAL de días únicos donde el promedio diario está por debajo del umbral
     (no necesariamente consecutivos)
@@ -40,23 +85,24 @@ def get_days_below_threshold(df, column, threshold):
     if df.empty:
         return 0
     
-    # Agrupar por DÍA y calcular promedio diario
-    df_daily = df.copy()
-    df_daily['Date'] = df_daily['DateTime'].dt.date
-    daily_avg = df_daily.groupby('Date')[column].mean().reset_index()
+    # Promedio diario (por DÍA, no por registro)
+    if daily_stats is None:
+        daily_stats = build_daily_stats(df)
     
     # Contar cuántos días están por debajo del umbral
-    days_below = (daily_avg[column] < threshold).sum()
+    days_below = (daily_stats[column] < threshold).sum()
     
     return days_below
 
-def get_unique_days_count(df):
+def get_unique_days_count(df, daily_stats=None):
     """
     Cuenta la cantidad de días únicos en el DataFrame (sin importar cuántos registros por día)
     """
     if df.empty:
         return 0
-    return df['DateTime'].dt.date.nunique()
+    if daily_stats is not None:
+        return len(daily_stats)
+    return df['DateTime'].dt.normalize().nunique()
 
 def get_weather_icon(event):
     """
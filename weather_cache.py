@@ -0,0 +1,142 @@
+import os
+import sqlite3
+from contextlib import closing
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+# Ubicación del cache (se puede cambiar con la variable de entorno SOILING_WEATHER_CACHE)
+DEFAULT_CACHE_PATH = os.environ.get(
+    "SOILING_WEATHER_CACHE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "weather.sqlite"),
+)
+# Modo sin conexión: sólo se sirve lo que ya está en cache
+OFFLINE = os.environ.get("SOILING_WEATHER_OFFLINE", "0") == "1"
+
+GRID_DECIMALS = 2          # Precisión de las coordenadas en las claves del cache (0.01°)
+# Paso de la grilla del reanálisis de Open-Meteo (ERA5-Land, 0.1° ≈ 11 km): todas las
+# coordenadas de una celda reciben la misma serie, así que se consultan y guardan una vez
+CELL_DEGREES = float(os.environ.get("SOILING_WEATHER_CELL", "0.1"))
+ARCHIVE_DELAY_DAYS = 7     # El archivo histórico de Open-Meteo se consolida con algunos días de retraso
+RECENT_TTL_HOURS = 6       # Los días aún no consolidados se vuelven a consultar pasado este tiempo
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS weather_hourly (
+    lat_key INTEGER NOT NULL,
+    lon_key INTEGER NOT NULL,
+    time TEXT NOT NULL,
+    temperature REAL,
+    precipitation REAL,
+    cloudcover REAL,
+    PRIMARY KEY (lat_key, lon_key, time)
+);
+CREATE TABLE IF NOT EXISTS weather_days (
+    lat_key INTEGER NOT NULL,
+    lon_key INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    fetched_at TEXT NOT NULL,
+    final INTEGER NOT NULL,
+    PRIMARY KEY (lat_key, lon_key, date)
+);
+"""
+
+def snap_coords(lat, lon, cell=None):
+    """
+    Punto de la grilla del reanálisis más cercano a lat/lon (centro de su celda).
+    Open-Meteo responde con el punto de grilla más cercano, así que consultar el centro
+    de la celda da los mismos datos que consultar cualquier coordenada dentro de ella.
+    """
+    cell = CELL_DEGREES if cell is None else cell
+    if not cell:
+        return round(float(lat), GRID_DECIMALS), round(float(lon), GRID_DECIMALS)
+    return (round(round(float(lat) / cell) * cell, GRID_DECIMALS + 4),
+            round(round(float(lon) / cell) * cell, GRID_DECIMALS + 4))
+
+def _coord_keys(lat, lon):
+    scale = 10 ** GRID_DECIMALS
+    return int(round(float(lat) * scale)), int(round(float(lon) * scale))
+
+def _connect(path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+def _date_range(start_date, end_date):
+    start = date.fromisoformat(str(start_date))
+    end = date.fromisoformat(str(end_date))
+    return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+def missing_ranges(lat, lon, start_date, end_date, path=DEFAULT_CACHE_PATH, now=None):
+    """
+    Devuelve los sub-rangos (start_date, end_date) que faltan en cache.
+    Los días consolidados nunca expiran; los recientes se consideran vencidos tras RECENT_TTL_HOURS.
+    """
+    now = now or datetime.now()
+    lat_key, lon_key = _coord_keys(lat, lon)
+    with closing(_connect(path)) as conn:
+        rows = conn.execute(
+            "SELECT date, fetched_at, final FROM weather_days "
+            "WHERE lat_key = ? AND lon_key = ? AND date BETWEEN ? AND ?",
+            (lat_key, lon_key, str(start_date), str(end_date)),
+        ).fetchall()
+
+    stale_before = now - timedelta(hours=RECENT_TTL_HOURS)
+    cached = {
+        d for d, fetched_at, final in rows
+        if final or datetime.fromisoformat(fetched_at) >= stale_before
+    }
+
+    ranges = []
+    for day in _date_range(start_date, end_date):
+        if day.isoformat() in cached:
+            continue
+        if ranges and ranges[-1][1] == day - timedelta(days=1):
+            ranges[-1][1] = day
+        else:
+            ranges.append([day, day])
+    return [(s.isoformat(), e.isoformat()) for s, e in ranges]
+
+def store_history(lat, lon, df, start_date, end_date, path=DEFAULT_CACHE_PATH, now=None):
+    """
+    Guarda las horas de df y marca como consultados todos los días del rango.
+    """
+    now = now or datetime.now()
+    lat_key, lon_key = _coord_keys(lat, lon)
+    final_until = (now - timedelta(days=ARCHIVE_DELAY_DAYS)).date()
+
+    records = [
+        (lat_key, lon_key, t.strftime("%Y-%m-%dT%H:%M"),
+         None if pd.isna(temp) else float(temp),
+         None if pd.isna(precip) else float(precip),
+         None if pd.isna(cloud) else float(cloud))
+        for t, temp, precip, cloud in zip(
+            df["time"], df["temperature"], df["precipitation"], df["cloudcover"]
+        )
+    ]
+    days = [
+        (lat_key, lon_key, day.isoformat(), now.isoformat(), int(day <= final_until))
+        for day in _date_range(start_date, end_date)
+    ]
+    with closing(_connect(path)) as conn, conn:
+        conn.executemany("INSERT OR REPLACE INTO weather_hourly VALUES (?, ?, ?, ?, ?, ?)", records)
+        conn.executemany("INSERT OR REPLACE INTO weather_days VALUES (?, ?, ?, ?, ?)", days)
+
+def load_history(lat, lon, start_date, end_date, path=DEFAULT_CACHE_PATH):
+    """
+    Lee del cache las horas del rango. Devuelve None si no hay ningún dato.
+    """
+    lat_key, lon_key = _coord_keys(lat, lon)
+    end_exclusive = (date.fromisoformat(str(end_date)) + timedelta(days=1)).isoformat()
+    with closing(_connect(path)) as conn:
+        df = pd.read_sql_query(
+            "SELECT time, temperature, precipitation, cloudcover FROM weather_hourly "
+            "WHERE lat_key = ? AND lon_key = ? AND time >= ? AND time < ? ORDER BY time",
+            conn,
+            params=(lat_key, lon_key, str(start_date), end_exclusive),
+        )
+    if df.empty:
+        return None
+    df["time"] = pd.to_datetime(df["time"])
+    return df